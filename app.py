@@ -1,8 +1,6 @@
 import streamlit as st
 import os
 from utils.pipeline import run_pipeline
-from utils.document_loader import load_document
-from utils.chunks import split_loaded_document
 
 # Configuration
 UPLOAD_FOLDER = "uploads"
@@ -13,7 +11,7 @@ st.title("📚 LawAI: Document Indexer + Embedder with Chroma")
 st.markdown("Upload a document to extract text, split into chunks, generate embeddings, and store with ChromaDB.")
 
 # File Upload
-uploaded_file = st.file_uploader("Upload a document (.pdf, .docx, .txt)", type=["pdf", "docx", "txt"])
+uploaded_file = st.file_uploader("Upload a document (.pdf, .docx, .txt, .png, .jpg)", type=["pdf", "docx", "txt", "png", "jpg", "jpeg"])
 
 file_path = None
 if uploaded_file is not None:
@@ -26,18 +24,21 @@ if uploaded_file is not None:
 if file_path and st.button("🚀 Run Pipeline"):
     with st.spinner("Running full pipeline (load → chunk → embed → store)..."):
         try:
-            run_pipeline(file_path)
+            result = run_pipeline(file_path)
+            if not result.succeeded:
+                raise RuntimeError(result.error)
             st.success("🎉 Document processed and stored successfully in ChromaDB!")
+            if result.failed_chunks:
+                st.warning(f"⚠️ {len(result.failed_chunks)} chunk(s) could not be embedded and were not stored; "
+                           "they will be retried the next time this file is processed.")
 
-            # Optional Preview After Processing
+            # Optional Preview After Processing (reuses the pages and chunks the pipeline already built)
             try:
-                documents = load_document(file_path)
                 st.subheader("📄 Extracted Document Preview")
-                st.text_area("Full Extracted Text", "\n".join([doc.page_content for doc in documents]), height=300)
+                st.text_area("Full Extracted Text", "\n".join([doc.page_content for doc in result.documents]), height=300)
 
-                chunks = split_loaded_document(file_path)
                 st.subheader("📝 First 3 Chunks Preview")
-                for i, chunk in enumerate(chunks[:3]):
+                for i, chunk in enumerate(result.chunks[:3]):
                     st.text_area(f"Chunk {i+1}", chunk.page_content, height=150)
 
             except Exception as e:
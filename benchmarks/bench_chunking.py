@@ -0,0 +1,147 @@
+# Usage: python -m benchmarks.bench_chunking [--shapes pages short long ocr] [--chunk-size 500] [--overlap 50]
+#                                            [--workers 1] [--repeat 3] [--save-baseline | --check [--threshold 0.2]]
+
+import argparse
+import json
+import os
+import random
+import sys
+import time
+import tracemalloc
+from langchain.docstore.document import Document
+from utils.chunks import CHUNK_METHODS, split_loaded_document, tiktoken_len
+
+WORDS = ("the court held that appellant respondent petition section order decree evidence witness "
+         "tribunal judgment clause agreement party plaintiff defendant statute hearing").split()
+
+# Baselines are machine specific: save them once on the machine that runs --check.
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), "baselines", "chunking.json")
+# --check fails when chunks/s drops by more than this share of the baseline.
+REGRESSION_THRESHOLD = 0.2
+
+
+def _paragraphs(rng: random.Random, count: int) -> str:
+    paragraphs = []
+    for _ in range(count):
+        sentences = [" ".join(rng.choices(WORDS, k=rng.randint(8, 30))).capitalize() + "."
+                     for _ in range(rng.randint(2, 6))]
+        paragraphs.append(" ".join(sentences))
+    return "\n\n".join(paragraphs)
+
+
+def _ocr_run(rng: random.Random, chars: int) -> str:
+    # Recognised scans without a layout pass: no line breaks, full stops or spaces, so every
+    # separator-based splitter falls through to its last resort.
+    text = ""
+    while len(text) < chars:
+        word = rng.choice(WORDS)
+        text += word.upper() if rng.random() < 0.2 else word
+        if rng.random() < 0.1:
+            text += str(rng.randint(1, 999))
+    return text[:chars]
+
+
+def synthetic_pages(pages: int, seed: int = 7, shape: str = "pages"):
+    """
+    `shape` "pages" is typical judgment pages, "short" one-paragraph pages (cover sheets,
+    orders), "long" pages of a few thousand words (untiled TXT, DOCX parts) and "ocr" pages
+    with no separators at all.
+    """
+    rng = random.Random(seed)
+    documents = []
+    for page in range(1, pages + 1):
+        if shape == "short":
+            text = _paragraphs(rng, 1)
+        elif shape == "long":
+            text = _paragraphs(rng, rng.randint(80, 120))
+        elif shape == "ocr":
+            text = _ocr_run(rng, rng.randint(2000, 3000))
+        else:
+            text = _paragraphs(rng, rng.randint(3, 8))
+        documents.append(Document(page_content=text, metadata={"source": "synthetic.pdf", "page": page}))
+    return documents
+
+
+# Page counts per shape keep each case to a comparable amount of text.
+SHAPES = {"pages": 200, "short": 2000, "long": 10, "ocr": 200}
+
+
+def measure(documents, chunk_size: int, overlap: int, method: str, workers: int, repeat: int) -> dict:
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        chunks = split_loaded_document("synthetic.pdf", chunk_size, overlap, documents=documents, method=method,
+                                       workers=workers)
+        best = min(best, time.perf_counter() - started)
+
+    # Separate run: tracemalloc slows allocation-heavy code, so it must not skew the timings.
+    tracemalloc.start()
+    split_loaded_document("synthetic.pdf", chunk_size, overlap, documents=documents, method=method, workers=workers)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    total_tokens = sum(tiktoken_len(doc.page_content) for doc in documents)
+    sizes = [tiktoken_len(chunk.page_content) for chunk in chunks] or [0]
+    return {
+        "chunks": len(chunks),
+        "seconds": best,
+        "chunks_per_s": len(chunks) / best,
+        "tokens_per_s": total_tokens / best,
+        "peak_mb": peak / 2 ** 20,
+        "avg_tokens": sum(sizes) / len(sizes),
+        "max_tokens": max(sizes)
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Chunking throughput and peak memory by text shape and splitter.")
+    parser.add_argument("--shapes", nargs="+", choices=list(SHAPES), default=list(SHAPES))
+    parser.add_argument("--methods", nargs="+", choices=CHUNK_METHODS, default=list(CHUNK_METHODS))
+    parser.add_argument("--pages", type=int, help="pages per shape (default: per-shape size in SHAPES)")
+    parser.add_argument("--chunk-size", type=int, default=500)
+    parser.add_argument("--overlap", type=int, default=50)
+    parser.add_argument("--workers", type=int, default=1, help="process pool size; 0 picks one per core")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--save-baseline", action="store_true", help=f"write results to {BASELINE_PATH}")
+    parser.add_argument("--check", action="store_true", help="exit 1 if chunks/s regressed against the baseline")
+    parser.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD)
+    args = parser.parse_args()
+
+    baseline = {}
+    if args.check:
+        with open(BASELINE_PATH, encoding="utf-8") as f:
+            baseline = json.load(f)
+
+    tiktoken_len("warm up")  # load the encoder outside the timed region
+    results, regressions = {}, []
+    print(f"{'shape':>6} {'method':>10} {'chunks':>7} {'best s':>8} {'chunks/s':>9} {'tokens/s':>10} "
+          f"{'peak MB':>8} {'avg tok':>8} {'max tok':>8} {'vs base':>8}")
+    for shape in args.shapes:
+        documents = synthetic_pages(args.pages or SHAPES[shape], shape=shape)
+        for method in args.methods:
+            key = f"{shape}/{method}/{args.chunk_size}/{args.overlap}/{args.workers}"
+            stats = measure(documents, args.chunk_size, args.overlap, method, args.workers or None, args.repeat)
+            results[key] = stats
+
+            change = ""
+            if key in baseline:
+                ratio = stats["chunks_per_s"] / baseline[key]["chunks_per_s"]
+                change = f"{ratio:.2f}x"
+                if ratio < 1 - args.threshold:
+                    regressions.append(f"{key}: {ratio:.2f}x of baseline chunks/s")
+            print(f"{shape:>6} {method:>10} {stats['chunks']:>7} {stats['seconds']:>8.3f} "
+                  f"{stats['chunks_per_s']:>9.1f} {stats['tokens_per_s']:>10.0f} {stats['peak_mb']:>8.1f} "
+                  f"{stats['avg_tokens']:>8.1f} {stats['max_tokens']:>8} {change:>8}")
+
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(BASELINE_PATH), exist_ok=True)
+        with open(BASELINE_PATH, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+        print(f"Baseline written to {BASELINE_PATH}")
+    if regressions:
+        print("Regressions:\n  " + "\n  ".join(regressions))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+# Usage: python -m benchmarks.bench_embedding [--chunks 2000] [--batch-size 2048] [--batch-tokens 300000]
+#                                             [--concurrency 1 4 8 16] [--latency 0.2] [--rate-limit-every 0]
+#                                             [--model text-embedding-3-small --dimensions 256]
+#        python -m benchmarks.bench_embedding --backend local [--runtimes torch int8 onnx] [--threads 4]
+
+import argparse
+import os
+import time
+from benchmarks.bench_chunking import synthetic_pages
+from benchmarks.stub_openai import start_stub_server
+
+
+def _run(label: str, backend, documents, baseline):
+    from utils.embedding_generator import embed_documents
+    started = time.perf_counter()
+    embeddings = embed_documents(documents, backend=backend, use_cache=False)
+    elapsed = time.perf_counter() - started
+    baseline = baseline or elapsed
+    print(f"{label:>12} {len(embeddings):>9} {elapsed:>8.2f} {len(embeddings) / elapsed:>9.1f} "
+          f"{baseline / elapsed:>7.2f}x")
+    return baseline
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Embedding throughput (chunks/sec), OpenAI against a local "
+                                                 "stub API or the local CPU backend.")
+    parser.add_argument("--backend", choices=["openai", "local"], default="openai")
+    parser.add_argument("--chunks", type=int, default=2000)
+    parser.add_argument("--batch-size", type=int, default=None, help="inputs per request or CPU batch")
+    parser.add_argument("--batch-tokens", type=int, default=None, help="tokens per request (openai)")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 8, 16], help="openai")
+    parser.add_argument("--model", default=None, help="openai; default OPENAI_EMBEDDING_MODEL")
+    parser.add_argument("--dimensions", type=int, default=None, help="openai; default EMBEDDING_DIMENSIONS")
+    parser.add_argument("--latency", type=float, default=0.2, help="seconds the stub waits per request")
+    parser.add_argument("--rate-limit-every", type=int, default=0, help="answer every Nth request with a 429")
+    parser.add_argument("--runtimes", nargs="+", default=["torch", "int8"], help="local")
+    parser.add_argument("--threads", type=int, default=0, help="local; 0 keeps the runtime default")
+    args = parser.parse_args()
+
+    documents = synthetic_pages(args.chunks, shape="short")
+    print(f"{'config':>12} {'embedded':>9} {'seconds':>8} {'chunks/s':>9} {'speedup':>8}")
+    baseline = None
+
+    if args.backend == "local":
+        from utils.embedding_backends import LOCAL_BATCH_SIZE, SentenceTransformerBackend
+        for runtime in args.runtimes:
+            backend = SentenceTransformerBackend(runtime=runtime, threads=args.threads,
+                                                 batch_size=args.batch_size or LOCAL_BATCH_SIZE)
+            backend.embed_texts(["warm up"])  # load the model outside the timed region
+            baseline = _run(runtime, backend, documents, baseline)
+        return
+
+    server, base_url = start_stub_server(args.latency, rate_limit_every=args.rate_limit_every)
+    # Set before the client is created: it reads these from the environment.
+    os.environ["OPENAI_BASE_URL"] = base_url
+    os.environ["OPENAI_API_KEY"] = "stub"
+    from utils.embedding_backends import (EMBEDDING_DIMENSIONS, MAX_BATCH_INPUTS, MAX_BATCH_TOKENS,
+                                          OPENAI_EMBEDDING_MODEL, OpenAIBackend)
+    dimensions = EMBEDDING_DIMENSIONS if args.dimensions is None else args.dimensions
+    try:
+        for concurrency in args.concurrency:
+            backend = OpenAIBackend(model=args.model or OPENAI_EMBEDDING_MODEL, dimensions=dimensions,
+                                    batch_size=args.batch_size or MAX_BATCH_INPUTS,
+                                    batch_tokens=args.batch_tokens or MAX_BATCH_TOKENS, concurrency=concurrency)
+            baseline = _run(f"conc={concurrency}", backend, documents, baseline)
+    finally:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+# Usage: python -m benchmarks.bench_embedding_memory [--chunks 10000] [--dimensions 1536] [--end-to-end]
+
+import argparse
+import os
+import time
+import tracemalloc
+import numpy as np
+from benchmarks.bench_chunking import synthetic_pages
+from benchmarks.stub_openai import start_stub_server
+
+
+def _peak(build):
+    # Returns (result, peak MB, seconds) for building one representation from scratch.
+    tracemalloc.start()
+    started = time.perf_counter()
+    result = build()
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, peak / 2 ** 20, elapsed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Peak memory of the embedding stage: per-chunk lists of Python "
+                                                 "floats against one float32 matrix.")
+    parser.add_argument("--chunks", type=int, default=10000)
+    parser.add_argument("--dimensions", type=int, default=1536)
+    parser.add_argument("--end-to-end", action="store_true",
+                        help="also run embed_documents against the local stub API")
+    args = parser.parse_args()
+
+    documents = synthetic_pages(args.chunks, shape="short")
+    rows = np.random.default_rng(7).random((args.chunks, args.dimensions), dtype=np.float32)
+    from utils.embedding_generator import EmbeddedChunks
+
+    print(f"{'representation':>16} {'peak MB':>9} {'seconds':>8}")
+    # What embed_documents used to return: one dict per chunk, vectors as lists of Python floats.
+    _, peak, elapsed = _peak(lambda: [
+        {"embedding": row.tolist(), "text": doc.page_content, "metadata": doc.metadata}
+        for row, doc in zip(rows, documents)
+    ])
+    print(f"{'list of floats':>16} {peak:>9.1f} {elapsed:>8.3f}")
+    _, peak, elapsed = _peak(lambda: EmbeddedChunks(chunks=list(documents), vectors=np.stack(list(rows))))
+    print(f"{'float32 matrix':>16} {peak:>9.1f} {elapsed:>8.3f}")
+
+    if not args.end_to_end:
+        return
+    server, base_url = start_stub_server(0.0, args.dimensions)
+    # Set before the client is created: it reads these from the environment.
+    os.environ["OPENAI_BASE_URL"] = base_url
+    os.environ["OPENAI_API_KEY"] = "stub"
+    from utils.embedding_backends import OpenAIBackend
+    from utils.embedding_generator import embed_documents
+    try:
+        embedded, peak, elapsed = _peak(lambda: embed_documents(documents, backend=OpenAIBackend(), use_cache=False))
+        print(f"{'embed_documents':>16} {peak:>9.1f} {elapsed:>8.3f}  ({embedded.vectors.nbytes / 2 ** 20:.1f} MB "
+              f"of vectors)")
+    finally:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
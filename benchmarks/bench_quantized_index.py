@@ -0,0 +1,75 @@
+# Usage: python -m benchmarks.bench_quantized_index [--vectors 100000] [--dimensions 384] [--queries 200]
+#                                                   [--modes int8 binary] [--candidates 50 100 200 400]
+
+import argparse
+import os
+import tempfile
+import time
+import numpy as np
+from utils.quantized_index import QUANTIZATION_MODES, QuantizedIndex
+
+# Vectors added per call, as store_document would.
+ADD_BATCH = 10000
+
+
+def synthetic_vectors(count: int, dimensions: int, seed: int = 7) -> np.ndarray:
+    # Clustered, with a shared offset, like real embeddings (topics; anisotropic models).
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((max(count // 200, 1), dimensions), dtype=np.float32)
+    offset = rng.standard_normal(dimensions, dtype=np.float32)
+    assignment = rng.integers(0, len(centers), count)
+    vectors = 0.5 * offset + centers[assignment] + 0.8 * rng.standard_normal((count, dimensions), dtype=np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def _timed(search, queries):
+    results, latencies = [], []
+    for query in queries:
+        started = time.perf_counter()
+        results.append([vector_id for vector_id, _ in search(query)])
+        latencies.append(time.perf_counter() - started)
+    return results, np.array(latencies) * 1000
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Recall@k and latency of quantized search with float32 "
+                                                 "rescoring, against exact float32 search.")
+    parser.add_argument("--vectors", type=int, default=100000)
+    parser.add_argument("--dimensions", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--modes", nargs="+", choices=QUANTIZATION_MODES, default=list(QUANTIZATION_MODES))
+    parser.add_argument("--candidates", type=int, nargs="+", default=[50, 100, 200, 400])
+    args = parser.parse_args()
+
+    vectors = synthetic_vectors(args.vectors, args.dimensions)
+    ids = [f"v{i}" for i in range(args.vectors)]
+    # Questions land near stored chunks but not on them.
+    rng = np.random.default_rng(11)
+    queries = vectors[rng.integers(0, args.vectors, args.queries)] + \
+        0.03 * rng.standard_normal((args.queries, args.dimensions), dtype=np.float32)
+
+    print(f"{'index':>8} {'cands':>6} {f'recall@{args.k}':>10} {'mean ms':>8} {'p95 ms':>7} {'memory MB':>10}")
+    with tempfile.TemporaryDirectory() as path:
+        for number, mode in enumerate(args.modes):
+            index = QuantizedIndex(path, mode)
+            for start in range(0, args.vectors, ADD_BATCH):
+                index.add(ids[start:start + ADD_BATCH], vectors[start:start + ADD_BATCH])
+            if number == 0:
+                truth, latencies = _timed(lambda query: index.exact_search(query, args.k), queries)
+                print(f"{'float32':>8} {'all':>6} {1:>10.3f} {latencies.mean():>8.2f} "
+                      f"{np.percentile(latencies, 95):>7.2f} {vectors.nbytes / 2 ** 20:>10.1f}")
+            for candidates in args.candidates:
+                found, latencies = _timed(lambda query: index.search(query, args.k, candidates), queries)
+                recall = np.mean([len(set(hits) & set(expected)) / len(expected)
+                                  for hits, expected in zip(found, truth)])
+                print(f"{mode:>8} {candidates:>6} {recall:>10.3f} {latencies.mean():>8.2f} "
+                      f"{np.percentile(latencies, 95):>7.2f} {index.memory_bytes / 2 ** 20:>10.1f}")
+            # The next mode encodes its codes from the same vectors on disk.
+            for name in os.listdir(path):
+                if name.startswith("codes-") or name.startswith("ranges-"):
+                    os.remove(os.path.join(path, name))
+
+
+if __name__ == "__main__":
+    main()
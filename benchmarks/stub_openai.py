@@ -0,0 +1,81 @@
+"""Local OpenAI-compatible /v1/embeddings server for benchmarks; no network or API key needed."""
+
+import base64
+import itertools
+import json
+import threading
+import struct
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional, Tuple
+
+STUB_DIMENSIONS = 1536
+
+
+def make_handler(latency: float, dimensions: int = STUB_DIMENSIONS, poison: Optional[str] = None,
+                 rate_limit_every: int = 0, retry_after: float = 0.5):
+    """
+    Requests with an input containing `poison` get a 400, and every `rate_limit_every`-th
+    request a 429 with Retry-After, to exercise the client's retry and split logic. Vectors
+    have `dimensions` values unless the request asks for another size.
+    """
+    # One vector for every input, serialised once per encoding and size: the stub should cost as
+    # little CPU as possible.
+    serialised = {}
+
+    def vector_for(encoding: str, size: int) -> str:
+        if (encoding, size) not in serialised:
+            values = [round(i / size, 6) for i in range(size)]
+            serialised[encoding, size] = (
+                json.dumps(base64.b64encode(struct.pack(f"<{size}f", *values)).decode("ascii"))
+                if encoding == "base64" else json.dumps(values)
+            )
+        return serialised[encoding, size]
+
+    counter = itertools.count(1)
+
+    class EmbeddingsHandler(BaseHTTPRequestHandler):
+        def _error(self, status: int, message: str, headers: Optional[dict] = None):
+            payload = json.dumps({"error": {"message": message, "type": "stub_error"}}).encode("utf-8")
+            self.send_response(status)
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+            inputs = body["input"] if isinstance(body["input"], list) else [body["input"]]
+            time.sleep(latency)  # stands in for the round trip to the real API
+            if rate_limit_every and next(counter) % rate_limit_every == 0:
+                return self._error(429, "Rate limit reached", {"Retry-After": str(retry_after)})
+            if poison and any(poison in str(text) for text in inputs):
+                return self._error(400, "Invalid input")
+            vector = vector_for(body.get("encoding_format") or "float", body.get("dimensions") or dimensions)
+            data = ", ".join(f'{{"object": "embedding", "index": {i}, "embedding": {vector}}}'
+                             for i in range(len(inputs)))
+            payload = (f'{{"object": "list", "data": [{data}], "model": {json.dumps(body.get("model", "stub"))}, '
+                       f'"usage": {{"prompt_tokens": 0, "total_tokens": 0}}}}').encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, *args):
+            pass
+
+    return EmbeddingsHandler
+
+
+def start_stub_server(latency: float = 0.2, dimensions: int = STUB_DIMENSIONS,
+                      **failures) -> Tuple[ThreadingHTTPServer, str]:
+    """
+    Serve on a free local port in a daemon thread; returns (server, base_url for the OpenAI
+    client). `failures` are passed to make_handler.
+    """
+    server = ThreadingHTTPServer(("127.0.0.1", 0), make_handler(latency, dimensions, **failures))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/v1"
@@ -1,8 +1,6 @@
 import streamlit as st
 import os
 from utils.pipeline import run_pipeline
-from utils.document_loader import load_document
-from utils.chunks import split_loaded_document
 from rag_pipeline.augmentation import augment_question
 from rag_pipeline.generation import generate_answer
 
@@ -18,7 +16,7 @@ tabs = st.tabs(["Document Indexing", "Legal Q&A"])
 with tabs[0]:
     st.header("📄 Document Indexer + Embedder with Chroma")
     st.markdown("Upload a document to extract text, split into chunks, generate embeddings, and store with ChromaDB.")
-    uploaded_file = st.file_uploader("Upload a document (.pdf, .docx, .txt)", type=["pdf", "docx", "txt"])
+    uploaded_file = st.file_uploader("Upload a document (.pdf, .docx, .txt, .png, .jpg)", type=["pdf", "docx", "txt", "png", "jpg", "jpeg"])
     file_path = None
     if uploaded_file is not None:
         file_path = os.path.join(UPLOAD_FOLDER, uploaded_file.name)
@@ -28,15 +26,18 @@ with tabs[0]:
     if file_path and st.button("🚀 Run Pipeline"):
         with st.spinner("Running full pipeline (load → chunk → embed → store)..."):
             try:
-                run_pipeline(file_path)
+                result = run_pipeline(file_path)
+                if not result.succeeded:
+                    raise RuntimeError(result.error)
                 st.success("🎉 Document processed and stored successfully in ChromaDB!")
+                if result.failed_chunks:
+                    st.warning(f"⚠️ {len(result.failed_chunks)} chunk(s) could not be embedded and were not stored; "
+                               "they will be retried the next time this file is processed.")
                 try:
-                    documents = load_document(file_path)
                     st.subheader("📄 Extracted Document Preview")
-                    st.text_area("Full Extracted Text", "\n".join([doc.page_content for doc in documents]), height=300)
-                    chunks = split_loaded_document(file_path)
+                    st.text_area("Full Extracted Text", "\n".join([doc.page_content for doc in result.documents]), height=300)
                     st.subheader("📝 First 3 Chunks Preview")
-                    for i, chunk in enumerate(chunks[:3]):
+                    for i, chunk in enumerate(result.chunks[:3]):
                         st.text_area(f"Chunk {i+1}", chunk.page_content, height=150)
                 except Exception as e:
                     st.warning(f"⚠️ Unable to preview extracted content after processing: {e}")
@@ -5,7 +5,7 @@ def augment_question(question: str, k: int = 5) -> dict:
     Retrieve relevant context for the given legal question.
     Returns a dict with keys: 'context', 'question'
     """
-    retrieved_docs = retrieve_legal_documents(question)
+    retrieved_docs = retrieve_legal_documents(question, max_parents=k)
     
     if not retrieved_docs:
         return {
@@ -1,28 +1,85 @@
 from langchain.vectorstores import Chroma
-from langchain.embeddings import OpenAIEmbeddings
 from langchain.retrievers.multi_query import MultiQueryRetriever
 from langchain.llms import OpenAI
+from langchain.schema import BaseRetriever, Document
+from langchain.callbacks.manager import CallbackManagerForRetrieverRun
 from dotenv import load_dotenv
+from typing import List
+import numpy as np
+from utils.embedding_backends import BackendEmbeddings, check_embedding_space
+from utils.chunk_store import get_chunks
+from utils.parent_store import get_parents
+from utils.store_house import COLLECTION_NAME, PERSIST_DIR, get_collection, recorded_space
+from utils.quantized_index import QUANTIZATION_MODES, RESCORE_CANDIDATES, VECTOR_INDEX, default_index
 import os
 
 load_dotenv()
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 
-embedding_model = OpenAIEmbeddings(openai_api_key=OPENAI_API_KEY)
+# Questions must be embedded by the same backend, model and dimensions as the stored chunks
+# (EMBEDDING_BACKEND, OPENAI_EMBEDDING_MODEL, EMBEDDING_DIMENSIONS); see check_query_space.
+embedding_model = BackendEmbeddings()
 
 chroma_store = Chroma(
-    collection_name="legal_documents",
+    collection_name=COLLECTION_NAME,
     embedding_function=embedding_model,
-    persist_directory="chroma_store"
+    persist_directory=PERSIST_DIR
 )
 
 llm = OpenAI(temperature=0, openai_api_key=OPENAI_API_KEY)
 
+# Child chunks are small, so a few precise matches per query are enough; the surrounding
+# text comes from their parent spans.
+CHILD_K = 4
+MAX_PARENTS = 5
+
+
+class QuantizedRetriever(BaseRetriever):
+    """Child chunks from the quantized index (VECTOR_INDEX "int8" or "binary"), texts from the chunk store."""
+    k: int = CHILD_K
+    candidates: int = RESCORE_CANDIDATES
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        vector = np.asarray(embedding_model.embed_query(query), dtype=np.float32)
+        hits = [vector_id for vector_id, _ in default_index().search(vector, self.k, self.candidates)]
+        chunks = get_chunks(hits)
+        return [chunks[vector_id] for vector_id in hits if vector_id in chunks]
+
+if VECTOR_INDEX in QUANTIZATION_MODES:
+    child_retriever = QuantizedRetriever()
+else:
+    child_retriever = chroma_store.as_retriever(search_kwargs={"k": CHILD_K})
 
 multi_query_retriever = MultiQueryRetriever.from_llm(
-    retriever=chroma_store.as_retriever(search_kwargs={"k": 10}),
+    retriever=child_retriever,
     llm=llm
 )
 
-def retrieve_legal_documents(query: str):
-    return multi_query_retriever.get_relevant_documents(query)
+
+def expand_to_parents(children, max_parents: int = MAX_PARENTS):
+    """
+    Replace matched child chunks with their parent spans, deduplicated and in match order.
+    Chunks stored before parents existed (no parent_id, or parent missing) are returned as is.
+    """
+    first_match = {}
+    for child in children:
+        first_match.setdefault(child.metadata.get("parent_id") or child.page_content, child)
+    keys = list(first_match)[:max_parents]
+
+    parents = get_parents([key for key in keys if first_match[key].metadata.get("parent_id")])
+    return [parents.get(key, first_match[key]) for key in keys]
+
+
+def check_query_space():
+    """
+    Refuse to search if the collection was built with another embedding model or dimension
+    than questions are embedded with (ValueError). Read on every query, since ingestion
+    records the space after this module is loaded.
+    """
+    recorded = recorded_space(get_collection())
+    check_embedding_space(recorded, embedding_model.backend.space)
+
+
+def retrieve_legal_documents(query: str, max_parents: int = MAX_PARENTS):
+    check_query_space()
+    return expand_to_parents(multi_query_retriever.get_relevant_documents(query), max_parents)
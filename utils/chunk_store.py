@@ -0,0 +1,63 @@
+import os
+from typing import Dict, Iterable, Sequence, Set
+from langchain.docstore.document import Document
+from utils.logger import logger
+from utils.sqlite_store import connect, select_in
+
+# Content-addressed chunk table: each unique chunk text once, keyed by metadata["content_hash"]
+# (see utils.chunks.content_hash), plus one reference row per place it occurs.
+CHUNK_DB = os.path.join("chroma_store", "chunks.sqlite3")
+SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS chunks (hash TEXT PRIMARY KEY, text TEXT NOT NULL)",
+    "CREATE TABLE IF NOT EXISTS chunk_refs ("
+    " hash TEXT NOT NULL REFERENCES chunks (hash), source TEXT NOT NULL, page INTEGER NOT NULL,"
+    " chunk INTEGER NOT NULL, parent_id TEXT NOT NULL, UNIQUE (hash, source, page, chunk, parent_id))",
+    "CREATE INDEX IF NOT EXISTS chunk_refs_hash ON chunk_refs (hash)",
+)
+
+
+def known_hashes(hashes: Iterable[str]) -> Set[str]:
+    """Return the subset of `hashes` already stored (and therefore already embedded)."""
+    hashes = list(set(hashes))
+    if not hashes or not os.path.exists(CHUNK_DB):
+        return set()
+    with connect(CHUNK_DB, SCHEMA) as conn:
+        return {row[0] for row in select_in(conn, "SELECT hash FROM chunks WHERE hash IN ({keys})", hashes)}
+
+
+def store_chunks(chunks: Iterable[Document]) -> int:
+    """Record every chunk as a reference to its content hash; returns the number of new texts."""
+    chunks = list(chunks)
+    with connect(CHUNK_DB, SCHEMA) as conn:
+        before = conn.total_changes
+        conn.executemany("INSERT OR IGNORE INTO chunks (hash, text) VALUES (?, ?)",
+                         [(chunk.metadata["content_hash"], chunk.page_content) for chunk in chunks])
+        new_texts = conn.total_changes - before
+        conn.executemany(
+            "INSERT OR IGNORE INTO chunk_refs (hash, source, page, chunk, parent_id) VALUES (?, ?, ?, ?, ?)",
+            [(chunk.metadata["content_hash"], str(chunk.metadata.get("source", "")), chunk.metadata.get("page", 0),
+              chunk.metadata.get("chunk", 0), chunk.metadata.get("parent_id", "")) for chunk in chunks]
+        )
+    logger.info(f"[Chunk Store] Recorded {len(chunks)} chunk references, {new_texts} new texts")
+    return new_texts
+
+
+def get_chunks(hashes: Sequence[str]) -> Dict[str, Document]:
+    """
+    Rebuild stored chunks by content hash, for indexes that hold only vectors (see
+    utils.quantized_index). A text stored in several places gets its first reference's metadata.
+    """
+    hashes = list(set(hashes))
+    if not hashes or not os.path.exists(CHUNK_DB):
+        return {}
+    found = {}
+    with connect(CHUNK_DB, SCHEMA) as conn:
+        rows = select_in(conn, "SELECT c.hash, c.text, r.source, r.page, r.chunk, r.parent_id FROM chunks c"
+                               " JOIN chunk_refs r ON r.rowid = (SELECT MIN(rowid) FROM chunk_refs WHERE hash = c.hash)"
+                               " WHERE c.hash IN ({keys})", hashes)
+        for digest, text, source, page, chunk, parent_id in rows:
+            metadata = {"source": source, "page": page, "chunk": chunk, "content_hash": digest}
+            if parent_id:
+                metadata["parent_id"] = parent_id
+            found[digest] = Document(page_content=text, metadata=metadata)
+    return found
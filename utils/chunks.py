@@ -1,45 +1,513 @@
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain.docstore.document import Document
-from typing import List 
+from bisect import bisect_left, bisect_right
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from itertools import groupby
+import hashlib
+import os
+import unicodedata
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
 from utils.document_loader import load_document
+from utils.legal_structure import iter_units
 from utils.logger import logger
+import numpy as np
 import tiktoken
 
+ENCODING_NAME = "cl100k_base"
+SEPARATORS = ["\n\n", "\n", ".", " ", ""]
+CHUNK_METHODS = ("token", "packed", "legal", "recursive")
+# How many earlier occurrences of a separator to try when one falls inside a token.
+MAX_SNAP_ATTEMPTS = 8
+
+# Packed chunking joins pages with this and splits once roughly this many chunks are buffered.
+PAGE_JOINER = "\n\n"
+PACK_BUFFER_CHUNKS = 8
+CHARS_PER_TOKEN = 4
+# Legal chunks below this share of the budget absorb the next unit even across a heading.
+LEGAL_MIN_FILL = 0.25
+# Parallel chunking: inputs shorter than this are chunked in-process, since pool start-up
+# (each worker loads the encoder) would cost more than it saves.
+CHUNK_PARALLEL_MIN_PAGES = 64
+CHUNK_MAX_WORKERS = 8
+# Batches per worker; several smaller batches keep workers busy when page sizes vary.
+CHUNK_BATCHES_PER_WORKER = 4
+# Methods whose chunks run across a whole source/section group, which cannot be split between workers.
+GROUPED_METHODS = ("packed", "legal")
+# Small-to-big retrieval: children are embedded, their parent spans are stored and returned.
+PARENT_CHUNK_SIZE = 1500
+CHILD_CHUNK_SIZE = 200
+CHILD_OVERLAP = 20
+# Page-level metadata that does not describe a chunk spanning several pages.
+PER_PAGE_KEYS = ("page", "part", "chunk", "total_chunks", "tokens", "char_start", "char_end",
+                 "byte_start", "byte_end", "boilerplate_tokens")
+
+# (text, char_start, char_end, token_count) of one chunk; offsets are into the split text.
+TokenChunk = Tuple[str, int, int, int]
+
+
+@lru_cache(maxsize=None)
+def get_encoder() -> tiktoken.Encoding:
+    return tiktoken.get_encoding(ENCODING_NAME)
+
+
+@lru_cache(maxsize=None)
+def _token_byte_lengths() -> np.ndarray:
+    # Built once per process; lets chunk offsets be computed with NumPy instead of decoding every token.
+    encoder = get_encoder()
+    lengths = np.zeros(encoder.max_token_value + 1, dtype=np.int64)
+    for token in range(len(lengths)):
+        try:
+            lengths[token] = len(encoder.decode_single_token_bytes(token))
+        except KeyError:
+            pass
+    return lengths
+
 
 def tiktoken_len(text: str) -> int:
-    tokenizer = tiktoken.get_encoding("cl100k_base")
-    return len(tokenizer.encode(text))
+    return len(get_encoder().encode(text, disallowed_special=()))
+
+
+def _char_offsets(text: str, tokens: List[int]) -> List[int]:
+    """Character offset at which each token starts, plus len(text) as a final sentinel."""
+    byte_ends = np.cumsum(_token_byte_lengths()[np.asarray(tokens, dtype=np.int64)])
+    utf8 = np.frombuffer(text.encode("utf-8"), dtype=np.uint8)
+    # chars_before[b] = number of characters that start before byte b (continuation bytes are 10xxxxxx).
+    chars_before = np.concatenate(([0], np.cumsum((utf8 & 0xC0) != 0x80)))
+    offsets = chars_before[np.concatenate(([0], byte_ends))].tolist()
+    offsets[-1] = len(text)
+    return offsets
+
+
+def _snap_end(text: str, offsets: List[int], start: int, end: int, chunk_size: int,
+              separators: Sequence[str]) -> int:
+    # Latest token boundary in the back half of the window that sits right after (or, for
+    # separators tokenised as a prefix like " the", right before) the highest-priority separator.
+    lo = start + chunk_size // 2
+    for sep in separators:
+        if not sep:
+            break
+        pos = text.rfind(sep, offsets[lo], offsets[end])
+        for _ in range(MAX_SNAP_ATTEMPTS):
+            if pos == -1:
+                break
+            for cut in (pos + len(sep), pos):
+                boundary = bisect_left(offsets, cut, lo, end + 1)
+                if boundary <= end and offsets[boundary] == cut:
+                    return boundary
+            pos = text.rfind(sep, offsets[lo], pos)
+    return end
+
+
+def _snap_start(text: str, offsets: List[int], start: int, end: int) -> int:
+    # Begin the overlap on a word boundary rather than inside a word.
+    for boundary in range(start, end):
+        cut = offsets[boundary]
+        if cut == 0 or cut >= len(text) or text[cut - 1].isspace() or text[cut].isspace():
+            return boundary
+    return start
+
+
+def split_text_by_tokens(text: str, chunk_size: int = 500, overlap: int = 50,
+                         separators: Sequence[str] = SEPARATORS) -> List[TokenChunk]:
+    """
+    Encode `text` once and cut it on token offsets: each chunk holds at most `chunk_size`
+    tokens, ends on the best separator in the back half of its window and overlaps the
+    previous chunk by up to `overlap` tokens. Chunks are exact (stripped) slices of `text`.
+    """
+    return [chunk for _, chunk in _token_pieces(text, chunk_size, overlap, separators)]
+
+
+def _token_pieces(text: str, chunk_size: int, overlap: int,
+                  separators: Sequence[str] = SEPARATORS) -> List[Tuple[int, TokenChunk]]:
+    # split_text_by_tokens, with the offset of each chunk's first token (before stripping),
+    # from where re-splitting longer text reproduces the same chunks.
+    tokens = get_encoder().encode(text, disallowed_special=())
+    if not tokens:
+        return []
+    offsets = _char_offsets(text, tokens)
+    total = len(tokens)
+
+    chunks = []
+    start = 0
+    while start < total:
+        end = min(start + chunk_size, total)
+        if end < total:
+            end = _snap_end(text, offsets, start, end, chunk_size, separators)
+
+        raw = text[offsets[start]:offsets[end]]
+        stripped = raw.strip()
+        if stripped:
+            char_start = offsets[start] + (len(raw) - len(raw.lstrip()))
+            chunks.append((offsets[start], (stripped, char_start, char_start + len(stripped), end - start)))
+
+        # Trailing tokens may add no characters (e.g. the rest of a split multi-byte character).
+        if end >= total or offsets[end] >= len(text):
+            break
+        start = _snap_start(text, offsets, max(start + 1, end - overlap), end)
+    return chunks
+
+
+def content_hash(text: str) -> str:
+    """
+    SHA-256 of `text` after NFKC normalisation and whitespace collapsing, so the same passage
+    extracted with different line breaks or ligatures hashes the same. Case is kept.
+    """
+    normalized = " ".join(unicodedata.normalize("NFKC", text).split())
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+
+def _page_metadata(page_starts: List[int], page_numbers: List[int], char_start: int, char_end: int) -> Dict[str, Any]:
+    page_start = page_numbers[bisect_right(page_starts, char_start) - 1]
+    page_end = page_numbers[bisect_right(page_starts, char_end - 1) - 1]
+    return {
+        "page": page_start,
+        "page_start": page_start,
+        "page_end": page_end,
+        "char_start": char_start,
+        "char_end": char_end
+    }
+
+
+def _number_chunks(chunks: List[Document]) -> List[Document]:
+    for i, chunk in enumerate(chunks):
+        chunk.metadata["chunk"] = i + 1
+        chunk.metadata["total_chunks"] = len(chunks)
+    return chunks
+
+
+def _pack_group(pages: Iterable[Document], chunk_size: int, overlap: int) -> List[Document]:
+    base: Optional[Dict[str, Any]] = None
+    page_starts: List[int] = []
+    page_numbers: List[int] = []
+    buffer = ""
+    buffer_start = 0  # offset of buffer[0] in the joined document text
+    length = 0
+    chunks = []
+
+    def split(final: bool) -> str:
+        nonlocal buffer_start
+        pieces = split_text_by_tokens(buffer, chunk_size, overlap)
+        # Until the last page is in, the final piece may still grow, so it is re-split next time.
+        carry_from = len(buffer) if final or len(pieces) < 2 else pieces[-1][1]
+        for text, char_start, char_end, tokens in pieces:
+            if char_start >= carry_from:
+                break
+            char_start, char_end = buffer_start + char_start, buffer_start + char_end
+            chunks.append(Document(page_content=text, metadata={
+                **base,
+                **_page_metadata(page_starts, page_numbers, char_start, char_end),
+                "tokens": tokens
+            }))
+        buffer_start += carry_from
+        return buffer[carry_from:]
+
+    for ordinal, page in enumerate(pages, start=1):
+        if not page.page_content.strip():
+            continue
+        if base is None:
+            base = {k: v for k, v in page.metadata.items() if k not in PER_PAGE_KEYS}
+        if length:
+            buffer += PAGE_JOINER
+            length += len(PAGE_JOINER)
+        page_starts.append(length)
+        page_numbers.append(page.metadata.get("page", page.metadata.get("part", ordinal)))
+        buffer += page.page_content
+        length += len(page.page_content)
+        if len(buffer) >= chunk_size * CHARS_PER_TOKEN * PACK_BUFFER_CHUNKS:
+            buffer = split(final=False)
+
+    if buffer:
+        split(final=True)
+    return _number_chunks(chunks)
+
 
+def _legal_group(pages: Iterable[Document], chunk_size: int, overlap: int) -> List[Document]:
+    # Like _pack_group, only a window of the joined text is held: from the start of the chunk
+    # still being packed to the end of the last page read. Units longer than the window arrive
+    # in parts (see iter_units); each part is split and its last piece carried into the next.
+    base: Optional[Dict[str, Any]] = None
+    page_starts: List[int] = []
+    page_numbers: List[int] = []
+    buffer = ""
+    buffer_start = 0  # offset of buffer[0] in the joined document text
+    length = 0
 
-def split_loaded_document(file_path: str, chunk_size: int = 500, overlap: int = 50) -> List[Document]:
-    documents = load_document(file_path)
+    def lines() -> Iterator[str]:
+        nonlocal base, buffer, length
+        partial = ""
+        for ordinal, page in enumerate(pages, start=1):
+            if not page.page_content.strip():
+                continue
+            if base is None:
+                base = {k: v for k, v in page.metadata.items() if k not in PER_PAGE_KEYS}
+            text = PAGE_JOINER + page.page_content if page_starts else page.page_content
+            page_starts.append(length + len(text) - len(page.page_content))
+            page_numbers.append(page.metadata.get("page", page.metadata.get("part", ordinal)))
+            buffer += text
+            length += len(text)
+            # The last line may go on in the next page ("\r" and "\n" included), so it waits.
+            split = (partial + text).splitlines(keepends=True)
+            partial = split.pop()
+            yield from split
+        if partial:
+            yield partial
 
+    chunks = []
+    # [char_start, char_end, tokens, section_path, heading, splittable] of the chunk being packed;
+    # units over budget are cut with the token splitter and their pieces never merged.
+    current: Optional[list] = None
+
+    def emit(span: list) -> None:
+        start, end, tokens, path, _, _ = span
+        raw = buffer[start - buffer_start:end - buffer_start]
+        stripped = raw.strip()
+        if not stripped:
+            return
+        char_start = start + (len(raw) - len(raw.lstrip()))
+        chunks.append(Document(page_content=stripped, metadata={
+            **base,
+            **_page_metadata(page_starts, page_numbers, char_start, char_start + len(stripped)),
+            "tokens": tokens,
+            "section_path": path
+        }))
+
+    def pack(span: list) -> None:
+        # Greedily pack whole units while they fit the budget. A new heading starts a new chunk
+        # unless the current one is still mostly empty (e.g. a run of cause-title lines).
+        nonlocal current
+        if (current and current[5] and span[5] and current[2] + span[2] <= chunk_size
+                and (current[4] == span[4] or current[2] < chunk_size * LEGAL_MIN_FILL)):
+            current[1] = span[1]
+            current[2] += span[2]
+            return
+        if current:
+            emit(current)
+        current = span
+
+    carry: Optional[int] = None  # start of the rest of a unit that arrived in parts
+    carry_split = False
+    max_chars = chunk_size * CHARS_PER_TOKEN * PACK_BUFFER_CHUNKS
+    for start, end, path, heading, final in iter_units(lines(), max_chars):
+        if carry is not None:
+            start = carry
+        text = buffer[start - buffer_start:end - buffer_start]
+        tokens = tiktoken_len(text)
+        if tokens <= chunk_size and not carry_split:
+            carry = None if final else start
+            if final:
+                pack([start, end, tokens, path, heading, True])
+        else:
+            pieces = _token_pieces(text, chunk_size, overlap)
+            # Until the unit's last part is in, its final piece may still grow.
+            carry = None if final or not pieces else start + pieces[-1][0]
+            carry_split = not final
+            for _, (_, piece_start, piece_end, piece_tokens) in pieces if final else pieces[:-1]:
+                pack([start + piece_start, start + piece_end, piece_tokens, path, heading, False])
+
+        keep = min(value for value in (carry, current and current[0], end) if value is not None)
+        if keep - buffer_start > len(buffer) // 2:
+            buffer = buffer[keep - buffer_start:]
+            buffer_start = keep
+
+    if base is None:
+        return []
+    if current:
+        emit(current)
+    return _number_chunks(chunks)
+
+
+def _group_key(doc: Document) -> Tuple:
+    return tuple(doc.metadata.get(key) for key in ("source", "section", "heading_path"))
+
+
+def pack_pages(documents: Iterable[Document], chunk_size: int = 500, overlap: int = 50) -> Iterator[Document]:
+    """
+    Chunk consecutive pages of a document as one text (pages joined with PAGE_JOINER), so short
+    pages share a chunk and chunks can cross page breaks. Pages are buffered only until about
+    PACK_BUFFER_CHUNKS chunks' worth of text is available. Each chunk records page_start/page_end
+    and char_start/char_end in the joined text. A change of source, section or heading_path
+    (DOCX parts) always ends a chunk.
+    """
+    for _, pages in groupby(documents, key=_group_key):
+        yield from _pack_group(pages, chunk_size, overlap)
+
+
+def chunk_legal_structure(documents: Iterable[Document], chunk_size: int = 500, overlap: int = 50) -> Iterator[Document]:
+    """
+    Structure-aware chunking for judgments and statutes. The pages of each document are read as
+    one text, of which only a window is held as in pack_pages, and cut at headings, "Section
+    12(3)" markers, numbered paragraphs and clauses (see utils.legal_structure). Whole units under the same heading are packed up to `chunk_size`
+    tokens, and only units larger than the budget are split. Each chunk records its
+    section_path and page range. A document with no detectable structure is chunked like
+    pack_pages.
+    """
+    for _, pages in groupby(documents, key=_group_key):
+        yield from _legal_group(pages, chunk_size, overlap)
+
+
+def _split_pages(documents: Iterable[Document], chunk_size: int, overlap: int, method: str) -> Iterator[Document]:
     splitter = RecursiveCharacterTextSplitter(
         chunk_size=chunk_size,
         chunk_overlap=overlap,
-        separators=["\n\n", "\n", ".", " ", ""],  
+        separators=SEPARATORS,
         length_function=tiktoken_len
     )
 
-    all_chunks = []
-
     for doc in documents:
         if not doc.page_content.strip():
-            continue  
+            continue
 
-        text_chunks = splitter.split_text(doc.page_content)
-        logger.info(f"[Chunking] File: {doc.metadata.get('source', 'unknown')} → {len(text_chunks)} chunks")
+        if method == "token":
+            pieces = [(text, {"tokens": tokens, "char_start": char_start, "char_end": char_end})
+                      for text, char_start, char_end, tokens
+                      in split_text_by_tokens(doc.page_content, chunk_size, overlap)]
+        else:
+            pieces = [(text, {}) for text in splitter.split_text(doc.page_content)]
+        logger.info(f"[Chunking] File: {doc.metadata.get('source', 'unknown')} → {len(pieces)} chunks")
 
-        for i, chunk in enumerate(text_chunks):
-            chunk_doc = Document(
+        for i, (chunk, extra) in enumerate(pieces):
+            yield Document(
                 page_content=chunk,
                 metadata={
                     **doc.metadata,
+                    **extra,
                     "chunk": i + 1,
-                    "total_chunks": len(text_chunks)
+                    "total_chunks": len(pieces)
                 }
             )
-            all_chunks.append(chunk_doc)
 
-    logger.info(f"[Chunking] Split {len(documents)} documents into {len(all_chunks)} chunks total")
+
+def _chunk_sequential(documents: Iterable[Document], chunk_size: int, overlap: int, method: str) -> Iterator[Document]:
+    if method == "packed":
+        return pack_pages(documents, chunk_size, overlap)
+    if method == "legal":
+        return chunk_legal_structure(documents, chunk_size, overlap)
+    return _split_pages(documents, chunk_size, overlap, method)
+
+
+def _chunk_batch(documents: List[Document], chunk_size: int, overlap: int, method: str) -> List[Document]:
+    # Pool worker; module-level so it can be pickled.
+    return list(_chunk_sequential(documents, chunk_size, overlap, method))
+
+
+def _chunk_batches(documents: List[Document], method: str, batch_count: int) -> List[List[Document]]:
+    # Token and recursive chunks never cross a page, so any page is a valid cut. Packed and
+    # legal chunks run across a whole source/section group, so batches hold whole groups.
+    if method in GROUPED_METHODS:
+        units = [list(pages) for _, pages in groupby(documents, key=_group_key)]
+    else:
+        units = [[doc] for doc in documents]
+
+    # Contiguous batches of roughly equal text size, so output order is input order.
+    target = sum(len(doc.page_content) for doc in documents) / batch_count
+    batches, batch, size = [], [], 0
+    for unit in units:
+        batch.extend(unit)
+        size += sum(len(doc.page_content) for doc in unit)
+        if size >= target:
+            batches.append(batch)
+            batch, size = [], 0
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+def split_documents_parallel(documents: Iterable[Document], chunk_size: int = 500, overlap: int = 50,
+                             method: str = "token", workers: Optional[int] = None) -> List[Document]:
+    """
+    Chunk pages from one or many documents in a process pool. The chunks and their metadata
+    are the same, in the same order, as chunking sequentially. `workers` None picks one per
+    core (up to CHUNK_MAX_WORKERS) for at least CHUNK_PARALLEL_MIN_PAGES pages, 1 disables
+    the pool.
+    """
+    documents = list(documents)
+    if workers is None:
+        workers = min(os.cpu_count() or 1, CHUNK_MAX_WORKERS) if len(documents) >= CHUNK_PARALLEL_MIN_PAGES else 1
+    workers = max(1, min(workers, len(documents)))
+    batches = _chunk_batches(documents, method, workers * CHUNK_BATCHES_PER_WORKER) if workers > 1 else []
+    # Grouped methods may yield fewer batches than workers, down to one for a single file.
+    workers = min(workers, len(batches))
+    if workers <= 1:
+        return _chunk_batch(documents, chunk_size, overlap, method)
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        results = pool.map(_chunk_batch, batches, [chunk_size] * len(batches), [overlap] * len(batches),
+                           [method] * len(batches))
+        chunks = [chunk for batch in results for chunk in batch]
+    logger.info(f"[Chunking] Chunked {len(documents)} documents in {len(batches)} batches "
+                f"using {workers} worker(s)")
+    return chunks
+
+
+def split_loaded_document(file_path: str, chunk_size: int = 500, overlap: int = 50,
+                          documents: Optional[Iterable[Document]] = None,
+                          method: str = "token", workers: Optional[int] = 1) -> List[Document]:
+    """
+    `method` "token" (default) tokenizes each page once and records the token count and
+    character offsets of every chunk; "packed" chunks across page breaks (see pack_pages);
+    "legal" keeps sections, numbered paragraphs and clauses whole (see chunk_legal_structure);
+    "recursive" is LangChain's RecursiveCharacterTextSplitter.
+    `workers` other than 1 chunks in a process pool (see split_documents_parallel); the
+    pages are then held in memory, so streamed input is no longer consumed lazily.
+    """
+    if method not in CHUNK_METHODS:
+        raise ValueError(f"Unknown chunking method: {method}. Supported: {', '.join(CHUNK_METHODS)}")
+
+    # Callers that already parsed the file pass the pages in, so it is not loaded twice.
+    # Any iterable works, including the lazy page stream from iter_document.
+    if documents is None:
+        documents = load_document(file_path)
+
+    if workers != 1:
+        documents = list(documents)
+        document_count = len(documents)
+        all_chunks = split_documents_parallel(documents, chunk_size, overlap, method, workers)
+    else:
+        def counted() -> Iterator[Document]:
+            nonlocal document_count
+            for doc in documents:
+                document_count += 1
+                yield doc
+
+        document_count = 0
+        all_chunks = list(_chunk_sequential(counted(), chunk_size, overlap, method))
+
+    for chunk in all_chunks:
+        chunk.metadata["content_hash"] = content_hash(chunk.page_content)
+    logger.info(f"[Chunking] Split {document_count} documents into {len(all_chunks)} chunks total")
     return all_chunks
+
+
+def split_parent_child(file_path: str, documents: Optional[Iterable[Document]] = None,
+                       parent_size: int = PARENT_CHUNK_SIZE, child_size: int = CHILD_CHUNK_SIZE,
+                       child_overlap: int = CHILD_OVERLAP, method: str = "legal",
+                       workers: Optional[int] = 1) -> Tuple[List[Document], List[Document]]:
+    """
+    Return (parents, children). Parents are split_loaded_document chunks of up to `parent_size`
+    tokens (a section or a few pages) and are stored but not embedded; each is cut into
+    `child_size`-token children for embedding. Both carry the parent's "parent_id", so the
+    retriever can map a matched child back to its parent span. The id is the parent's content
+    hash: it names the text itself, so another file with the same name, or re-chunking this
+    one, can never point stored children at a different span.
+    """
+    parents = split_loaded_document(file_path, parent_size, child_overlap, documents=documents, method=method,
+                                    workers=workers)
+    children = []
+    for parent in parents:
+        parent.metadata["parent_id"] = parent.metadata["content_hash"]
+        offset = parent.metadata.get("char_start", 0)
+        pieces = split_text_by_tokens(parent.page_content, child_size, child_overlap)
+        for j, (text, char_start, char_end, tokens) in enumerate(pieces):
+            children.append(Document(page_content=text, metadata={
+                **parent.metadata,
+                "char_start": offset + char_start,
+                "char_end": offset + char_end,
+                "tokens": tokens,
+                "chunk": j + 1,
+                "total_chunks": len(pieces),
+                "content_hash": content_hash(text)
+            }))
+
+    logger.info(f"[Chunking] Split {len(parents)} parent spans into {len(children)} child chunks")
+    return parents, children
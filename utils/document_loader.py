@@ -1,51 +1,225 @@
 import os 
-from typing import List
-import pdfplumber 
-from langchain.document_loaders import TextLoader
+from collections import Counter, deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Iterable, Iterator, List, Optional, Tuple
 from langchain.docstore.document import Document
-from docx import Document as DocxDocument
 from utils.logger import logger 
+from utils.parse_cache import cached_loader, cached_stream
+from utils.docx_reader import iter_docx_parts
+from utils.text_reader import iter_text_pages
+from utils.pdf_engines import DEFAULT_PDF_ENGINE, ExtractedPage, extract_range, get_pdf_engine, is_usable_text
+from utils.photo_ocr import OCR_MAX_WORKERS, load_image, ocr_available, ocr_pdf_page, prune_cache
 
-def load_pdf(file_path: str) -> List[Document]:
+# Bump when extraction output changes in a way the source fingerprint cannot see (e.g. a library upgrade).
+LOADER_VERSION = "1"
+
+# Documents shorter than this are extracted in-process; pool start-up would cost more than it saves.
+PDF_PARALLEL_MIN_PAGES = 32
+PDF_MAX_WORKERS = 8
+# Ranges per worker; several smaller ranges keep workers busy when some pages are much heavier.
+PDF_RANGES_PER_WORKER = 4
+# Pages queued for OCR per worker before the stream waits on the oldest one.
+OCR_WINDOW_PER_WORKER = 2
+# Upper bound on the text held for one DOCX part; parts also end at headings and section breaks.
+DOCX_PART_CHARS = 4000
+# Size of a virtual TXT page, roughly one printed page of text.
+TXT_PAGE_BYTES = 4096
+
+
+def _page_documents(file_path: str, pages: Iterable[ExtractedPage]) -> Iterator[Document]:
+    for page_num, text, page_engine in pages:
+        if text:
+            yield Document(
+                page_content = text,
+                metadata={
+                    "source": file_path,
+                    "page": page_num+1,
+                    "engine": page_engine
+                }
+            )
+
+
+def _resolve_ocr(page: ExtractedPage, future: Optional[Future]) -> ExtractedPage:
+    if future is None:
+        return page
+    page_num = page[0]
+    try:
+        text = future.result()
+    except Exception as e:
+        logger.error(f"[OCR] Page {page_num + 1} failed: {e}")
+        return page
+    return (page_num, text, "ocr") if text.strip() else page
+
+
+def _with_ocr(file_path: str, pages: Iterable[ExtractedPage]) -> Iterator[ExtractedPage]:
+    """
+    OCR the pages that have no usable text layer in a process pool, keeping page order.
+    The pool is only started once such a page turns up, and at most
+    OCR_WINDOW_PER_WORKER pages per worker are in flight at a time.
+    """
+    workers = min(os.cpu_count() or 1, OCR_MAX_WORKERS)
+    window = workers * OCR_WINDOW_PER_WORKER
+    pool = None
+    pending = deque()
+    try:
+        for page in pages:
+            if is_usable_text(page[1]) or not ocr_available():
+                pending.append((page, None))
+            else:
+                pool = pool or ProcessPoolExecutor(max_workers=workers)
+                pending.append((page, pool.submit(ocr_pdf_page, file_path, page[0])))
+            while pending and (pending[0][1] is None or pending[0][1].done() or len(pending) > window):
+                yield _resolve_ocr(*pending.popleft())
+        while pending:
+            yield _resolve_ocr(*pending.popleft())
+    finally:
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+            prune_cache()
+
+
+def _ocr_context(options: dict) -> dict:
+    # Pages that needed OCR come out empty without Tesseract; keep those results apart.
+    return {"ocr_available": ocr_available()} if options.get("ocr", True) else {}
+
+
+def _pdf_page_ranges(page_count: int, workers: int) -> List[Tuple[int, int]]:
+    step = max(1, -(-page_count // (workers * PDF_RANGES_PER_WORKER)))
+    return [(start, min(start + step, page_count)) for start in range(0, page_count, step)]
+
+
+@cached_loader("pdf", LOADER_VERSION, depends_on=("utils.pdf_engines", "utils.photo_ocr"), ignore=("workers",),
+               context=_ocr_context)
+def load_pdf(file_path: str, workers: Optional[int] = None, engine: str = DEFAULT_PDF_ENGINE,
+             ocr: bool = True) -> List[Document]:
+    """
+    `workers` caps the process pool used for page-parallel extraction; None picks one per core
+    (up to PDF_MAX_WORKERS) for documents of at least PDF_PARALLEL_MIN_PAGES pages, 1 disables it.
+    `engine` is one of utils.pdf_engines.PDF_ENGINES; the engine used is recorded per page.
+    With `ocr`, pages without a usable text layer are recognised with Tesseract (engine "ocr").
+    """
     try:
-        documents = []
-        with pdfplumber.open(file_path) as pdf:
-            for page_num, page in enumerate(pdf.pages):
-                text = page.extract_text()
-                if text:
-                    documents.append(Document(
-                        page_content = text,
-                        metadata={
-                            "source": file_path,
-                            "page": page_num+1
-                        }
-                    ))
-        logger.info(f"[PDF] Extracted {len(documents)} pages from {file_path}")
+        extractor = get_pdf_engine(engine)
+        page_count = extractor.page_count(file_path)
+        if workers is None:
+            workers = min(os.cpu_count() or 1, PDF_MAX_WORKERS) if page_count >= PDF_PARALLEL_MIN_PAGES else 1
+        workers = max(1, min(workers, page_count))
+
+        if workers == 1:
+            pages = extractor.iter_pages(file_path, 0, page_count)
+        else:
+            ranges = _pdf_page_ranges(page_count, workers)
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                results = pool.map(extract_range, [engine] * len(ranges), [file_path] * len(ranges),
+                                   [start for start, _ in ranges], [end for _, end in ranges])
+                pages = [page for chunk in results for page in chunk]
+
+        if ocr:
+            pages = _with_ocr(file_path, pages)
+        documents = list(_page_documents(file_path, pages))
+        engine_counts = Counter(doc.metadata["engine"] for doc in documents)
+        logger.info(f"[PDF] Extracted {len(documents)} pages from {file_path} using {workers} worker(s), "
+                    f"engines: {dict(engine_counts)}")
         return documents
     except Exception as e:
         logger.error(f"[PDF] Failed to extract pages from {file_path}: {e}")
         raise RuntimeError(f"PDF loading failed for {file_path}") from e
-    
+
+
+@cached_stream("pdf", LOADER_VERSION, depends_on=("utils.pdf_engines", "utils.photo_ocr"), context=_ocr_context)
+def iter_pdf_pages(file_path: str, engine: str = DEFAULT_PDF_ENGINE, ocr: bool = True) -> Iterator[Document]:
+    """
+    Streaming counterpart of load_pdf: yields one page at a time and releases the extractor's
+    per-page caches before moving on, so peak memory does not grow with the page count.
+    Shares load_pdf's parse cache entries.
+    """
+    try:
+        count = 0
+        pages = get_pdf_engine(engine).iter_pages(file_path)
+        if ocr:
+            pages = _with_ocr(file_path, pages)
+        for doc in _page_documents(file_path, pages):
+            count += 1
+            yield doc
+        logger.info(f"[PDF] Streamed {count} pages from {file_path}")
+    except Exception as e:
+        logger.error(f"[PDF] Failed to stream pages from {file_path}: {e}")
+        raise RuntimeError(f"PDF loading failed for {file_path}") from e
+
+
+def _txt_documents(file_path: str) -> Iterator[Document]:
+    for page, (text, byte_start, byte_end, encoding) in enumerate(iter_text_pages(file_path, TXT_PAGE_BYTES), start=1):
+        if text.strip():
+            yield Document(
+                page_content=text,
+                metadata={
+                    "source": file_path,
+                    "page": page,
+                    "byte_start": byte_start,
+                    "byte_end": byte_end,
+                    "encoding": encoding
+                }
+            )
+
+
+@cached_stream("txt", LOADER_VERSION, depends_on=("utils.text_reader",))
+def iter_txt(file_path: str) -> Iterator[Document]:
+    """
+    Stream a text file as virtual pages of about TXT_PAGE_BYTES, memory-mapped and decoded
+    with the detected encoding. byte_start/byte_end in the metadata locate each page in the file.
+    """
+    try:
+        count = 0
+        for doc in _txt_documents(file_path):
+            count += 1
+            yield doc
+        logger.info(f"[TXT Loader] Streamed {count} pages from text file: {file_path}")
+    except Exception as e:
+        logger.error(f"[TXT Loader] Failed to load text file {file_path}: {e}")
+        raise RuntimeError(f"TXT loading failed for {file_path}") from e
+
+
+@cached_loader("txt", LOADER_VERSION, depends_on=("utils.text_reader",))
 def load_txt(file_path: str) -> List[Document]:
     try:
-        loader = TextLoader(file_path, encoding='utf-8')
-        docs = loader.load()
-        logger.info(f"[TXT Loader] Loaded text file: {file_path}")
+        docs = list(_txt_documents(file_path))
+        encoding = docs[0].metadata["encoding"] if docs else "n/a"
+        logger.info(f"[TXT Loader] Loaded text file: {file_path} ({len(docs)} pages, {encoding})")
         return docs
     except Exception as e:
         logger.error(f"[TXT Loader] Failed to load text file {file_path}: {e}")
-        raise RuntimeError(f"TXT loading failed for {file_path}")
-    
+        raise RuntimeError(f"TXT loading failed for {file_path}") from e
+
+
+def _docx_documents(file_path: str) -> Iterator[Document]:
+    for part, (text, metadata) in enumerate(iter_docx_parts(file_path, DOCX_PART_CHARS), start=1):
+        yield Document(page_content=text, metadata={"source": file_path, "part": part, **metadata})
+
+
+@cached_stream("docx", LOADER_VERSION, depends_on=("utils.docx_reader",))
+def iter_docx(file_path: str) -> Iterator[Document]:
+    """
+    Stream a .docx as parts: paragraphs and table rows in document order, split at headings
+    and section breaks and capped at DOCX_PART_CHARS, with section/heading metadata.
+    """
+    try:
+        words = 0
+        for doc in _docx_documents(file_path):
+            words += len(doc.page_content.split())
+            yield doc
+        logger.info(f"[DOCX Loader] Streamed DOCX with {words} words from {file_path}")
+    except Exception as e:
+        logger.error(f"[DOCX Loader] Error loading DOCX: {e}")
+        raise RuntimeError(f"DOCX loading failed for {file_path}") from e
+
+
+@cached_loader("docx", LOADER_VERSION, depends_on=("utils.docx_reader",))
 def load_docs(file_path: str) -> List[Document]:
     try:
-        docx_obj = DocxDocument(file_path)
-        full_text = "\n".join([para.text.strip() for para in docx_obj.paragraphs if para.text.strip()])
-        metadata = {
-            "source":file_path
-        }
-        document = Document(page_content=full_text, metadata=metadata)
-        logger.info(f"[DOCX Loader] Loaded DOCX with {len(full_text.split())} words from {file_path}")
-        return [document]
+        documents = list(_docx_documents(file_path))
+        words = sum(len(doc.page_content.split()) for doc in documents)
+        logger.info(f"[DOCX Loader] Loaded DOCX with {words} words in {len(documents)} parts from {file_path}")
+        return documents
     except Exception as e:
         logger.error(f"[DOCX Loader] Error loading DOCX: {e}")
         raise RuntimeError(f"DOCX loading failed for {file_path}") from e
@@ -63,5 +237,25 @@ def load_document(file_path: str) -> List[Document]:
         return load_txt(file_path)
     elif ext == '.docx':
         return load_docs(file_path)
+    elif ext in ('.png', '.jpg', '.jpeg'):
+        return load_image(file_path)
     else:
-        raise ValueError(f"Unsupported file type: {ext}. Supported: .pdf, .txt, .docx")
\ No newline at end of file
+        raise ValueError(f"Unsupported file type: {ext}. Supported: .pdf, .txt, .docx, .png, .jpg")
+
+
+def iter_document(file_path: str) -> Iterator[Document]:
+    """
+    Yield the pages of a document lazily where the format allows it (PDF, DOCX, TXT);
+    other formats are loaded whole and then yielded.
+    """
+    if not os.path.exists(file_path):
+        raise FileNotFoundError(f"File not found: {file_path}")
+
+    ext = os.path.splitext(file_path)[1].lower()
+    if ext == '.pdf':
+        return iter_pdf_pages(file_path)
+    if ext == '.docx':
+        return iter_docx(file_path)
+    if ext == '.txt':
+        return iter_txt(file_path)
+    return iter(load_document(file_path))
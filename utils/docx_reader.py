@@ -0,0 +1,150 @@
+import re
+import zipfile
+from typing import Dict, Iterator, List, Optional, Tuple
+from lxml import etree
+
+W = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+HEADING_STYLE = re.compile(r"^heading\s*(\d)$", re.IGNORECASE)
+CELL_SEPARATOR = " | "
+
+# (kind, text, heading level). kind is "paragraph", "row" or "section_break";
+# level is set for headings only (0 for Title, 1-9 for Heading 1-9).
+Block = Tuple[str, str, Optional[int]]
+
+
+def _heading_levels(archive: zipfile.ZipFile) -> Dict[str, int]:
+    # styles.xml is small, so it is parsed whole; style IDs are localised, names and outline levels are not.
+    try:
+        root = etree.fromstring(archive.read("word/styles.xml"))
+    except KeyError:
+        return {}
+
+    levels = {}
+    for style in root.iter(f"{W}style"):
+        style_id = style.get(f"{W}styleId")
+        name = style.find(f"{W}name")
+        name = name.get(f"{W}val", "") if name is not None else ""
+        outline = style.find(f"{W}pPr/{W}outlineLvl")
+        match = HEADING_STYLE.match(name)
+        if name.lower() == "title":
+            levels[style_id] = 0
+        elif match:
+            levels[style_id] = int(match.group(1))
+        elif outline is not None:
+            levels[style_id] = int(outline.get(f"{W}val", "0")) + 1
+    return levels
+
+
+def _text(element) -> str:
+    parts = []
+    for node in element.iter(f"{W}t", f"{W}tab", f"{W}br", f"{W}cr"):
+        if node.tag == f"{W}t":
+            parts.append(node.text or "")
+        elif node.tag == f"{W}tab":
+            parts.append("\t")
+        else:
+            parts.append("\n")
+    return "".join(parts).strip()
+
+
+def _row_text(row) -> str:
+    cells = []
+    for cell in row.iterfind(f"{W}tc"):
+        cells.append(" ".join(text for text in (_text(p) for p in cell.iter(f"{W}p")) if text))
+    return CELL_SEPARATOR.join(cells).strip(" |")
+
+
+def _release(element) -> None:
+    # Free the element and every already-processed sibling so the tree never grows past one block.
+    element.clear()
+    parent = element.getparent()
+    while element.getprevious() is not None:
+        del parent[0]
+
+
+def iter_docx_blocks(file_path: str) -> Iterator[Block]:
+    """
+    Stream the body of a .docx in document order: paragraphs, table rows (cells joined with
+    CELL_SEPARATOR) and section breaks, without building the python-docx object model.
+    """
+    with zipfile.ZipFile(file_path) as archive:
+        heading_levels = _heading_levels(archive)
+        with archive.open("word/document.xml") as xml:
+            table_depth = 0
+            for event, elem in etree.iterparse(xml, events=("start", "end"),
+                                               tag=(f"{W}tbl", f"{W}tr", f"{W}p")):
+                if elem.tag == f"{W}tbl":
+                    if event == "start":
+                        table_depth += 1
+                    else:
+                        table_depth -= 1
+                        if table_depth == 0:
+                            _release(elem)
+                    continue
+                if event == "start":
+                    continue
+
+                if elem.tag == f"{W}tr":
+                    # Nested tables are flattened into the cell text of their outermost row.
+                    if table_depth == 1:
+                        text = _row_text(elem)
+                        if text:
+                            yield "row", text, None
+                        _release(elem)
+                    continue
+
+                if table_depth:
+                    continue
+                style = elem.find(f"{W}pPr/{W}pStyle")
+                level = heading_levels.get(style.get(f"{W}val")) if style is not None else None
+                section_break = elem.find(f"{W}pPr/{W}sectPr") is not None
+                text = _text(elem)
+                _release(elem)
+                if text:
+                    yield "paragraph", text, level
+                if section_break:
+                    yield "section_break", "", None
+
+
+def iter_docx_parts(file_path: str, max_chars: int) -> Iterator[Tuple[str, Dict[str, object]]]:
+    """
+    Group blocks into parts of at most `max_chars` (a single oversized block stays whole).
+    A new part starts at every heading and section break. Each part carries its section
+    number and heading path, so the chunker never has to merge text across those boundaries.
+    """
+    section = 1
+    headings: List[Tuple[int, str]] = []
+    buffer: List[str] = []
+    size = 0
+    tables = 0
+
+    def flush():
+        nonlocal buffer, size, tables
+        if buffer:
+            yield "\n".join(buffer), {
+                "section": section,
+                "heading": headings[-1][1] if headings else "",
+                "heading_path": " > ".join(text for _, text in headings),
+                "table_rows": tables,
+            }
+        buffer, size, tables = [], 0, 0
+
+    for kind, text, level in iter_docx_blocks(file_path):
+        if kind == "section_break":
+            yield from flush()
+            section += 1
+            continue
+
+        if level is not None:
+            yield from flush()
+            headings = [(lvl, heading) for lvl, heading in headings if lvl < level]
+            headings.append((level, text))
+        elif size and size + len(text) > max_chars:
+            yield from flush()
+
+        buffer.append(text)
+        size += len(text) + 1
+        if kind == "row":
+            tables += 1
+
+    yield from flush()
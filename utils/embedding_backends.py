@@ -0,0 +1,376 @@
+import os
+import time
+import base64
+import random
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import Any, Coroutine, Dict, List, Optional, Tuple
+import numpy as np
+from tqdm import tqdm
+from dotenv import load_dotenv
+from openai import (APIConnectionError, AsyncOpenAI, BadRequestError, InternalServerError, OpenAI, RateLimitError,
+                    UnprocessableEntityError)
+from langchain.embeddings.base import Embeddings
+from utils.chunks import get_encoder
+from utils.logger import logger
+
+load_dotenv()
+
+# OpenAI backend. EMBEDDING_DIMENSIONS 0 keeps the model's native size (1536 for ada-002 and
+# text-embedding-3-small, 3072 for -3-large); only text-embedding-3 models accept a smaller one,
+# e.g. 256 or 512, which shrinks the index and speeds up search.
+OPENAI_EMBEDDING_MODEL = os.getenv("OPENAI_EMBEDDING_MODEL", "text-embedding-ada-002")
+EMBEDDING_DIMENSIONS = int(os.getenv("EMBEDDING_DIMENSIONS", "0"))
+DIMENSIONS_MODEL_PREFIX = "text-embedding-3"
+# Every collection filled before spaces were recorded was embedded with ada-002 at its native size.
+LEGACY_EMBEDDING_SPACE = {"embedding_model": "text-embedding-ada-002", "embedding_dimensions": 0}
+# Per-input limit of the embedding model; longer chunks are truncated before sending.
+MAX_TOKENS = 8191
+# Per-request ceilings of the embeddings endpoint; batches are packed up to both.
+MAX_BATCH_TOKENS = 300_000
+MAX_BATCH_INPUTS = 2048
+# Embedding requests in flight at once; results are reassembled in input order.
+EMBED_CONCURRENCY = 8
+# Retries per request for rate limits, timeouts and server errors, with full-jitter exponential
+# backoff unless the server sends Retry-After. A batch the API rejects as invalid is split in
+# half until the failing inputs are isolated; other errors (e.g. authentication) fail it whole.
+EMBED_MAX_RETRIES = 6
+BACKOFF_BASE_SECONDS = 1.0
+BACKOFF_MAX_SECONDS = 60.0
+RETRYABLE_ERRORS = (RateLimitError, APIConnectionError, InternalServerError)  # APITimeoutError is an APIConnectionError
+SPLITTABLE_ERRORS = (BadRequestError, UnprocessableEntityError)
+
+# Local sentence-transformers backend. Runtimes: "torch", "int8" (PyTorch dynamic quantization
+# of the linear layers) or "onnx" (ONNX Runtime; needs sentence-transformers>=3.2 and
+# optimum[onnxruntime], otherwise falls back to "torch"). Threads 0 leaves the runtime default.
+LOCAL_EMBEDDING_MODEL = os.getenv("LOCAL_EMBEDDING_MODEL", "BAAI/bge-small-en-v1.5")
+LOCAL_RUNTIMES = ("torch", "int8", "onnx")
+LOCAL_RUNTIME = os.getenv("LOCAL_EMBEDDING_RUNTIME", "torch")
+LOCAL_THREADS = int(os.getenv("LOCAL_EMBEDDING_THREADS", "0"))
+LOCAL_BATCH_SIZE = 64
+
+# One embedding: a 1-D float32 array. Vectors stay in NumPy from the API response to Chroma.
+Vector = np.ndarray
+
+# "openai" or "local"; the same backend must embed the chunks and the questions.
+DEFAULT_EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "openai")
+
+
+def run_sync(coroutine: Coroutine) -> Any:
+    """Run `coroutine` to completion from synchronous code, even if an event loop is already running."""
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coroutine)
+    # Already inside an event loop (e.g. a notebook): run on a fresh loop in another thread.
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        return pool.submit(asyncio.run, coroutine).result()
+
+
+class EmbeddingBackend:
+    """
+    Turns texts into vectors. `model` and `dimensions` (0: the model's native size) name the
+    vector space: they key the embedding cache and are recorded on the Chroma collection, so
+    two backends that return different vectors must not share both.
+    """
+    name = ""
+    model = ""
+    dimensions = 0
+
+    @property
+    def space(self) -> Dict[str, Any]:
+        # Stored as Chroma collection metadata; see check_embedding_space.
+        return {"embedding_model": self.model, "embedding_dimensions": self.dimensions}
+
+    async def embed(self, texts: List[str], errors: Dict[int, str]) -> List[Optional[Vector]]:
+        """One vector per text, in order; a text that could not be embedded is None with its reason in `errors`."""
+        raise NotImplementedError
+
+    def embed_texts(self, texts: List[str]) -> List[List[float]]:
+        # Plain lists for LangChain callers (question embedding); ingestion stays in NumPy.
+        errors: Dict[int, str] = {}
+        vectors = run_sync(self.embed(texts, errors))
+        if errors:
+            raise RuntimeError(f"Embedding failed for {len(errors)} of {len(texts)} texts: "
+                               f"{errors[min(errors)]}")
+        return [vector.tolist() for vector in vectors]
+
+    def embed_query(self, text: str) -> List[float]:
+        # One question at a time; backends override this with a lighter path than embed().
+        return self.embed_texts([text])[0]
+
+
+def check_embedding_space(recorded: Optional[Dict[str, Any]], expected: Dict[str, Any]) -> None:
+    """
+    Raise ValueError if collection metadata `recorded` names another model or dimension than
+    the space `expected` (EmbeddingBackend.space): vectors from different spaces must never be
+    compared. An empty record (a collection with no vectors yet) passes; see
+    utils.store_house.recorded_space for collections filled before spaces were recorded.
+    """
+    recorded = recorded or {}
+    if "embedding_model" not in recorded:
+        return
+    if any(recorded.get(key) != value for key, value in expected.items()):
+        raise ValueError(
+            f"Collection was embedded with {recorded.get('embedding_model')} "
+            f"({recorded.get('embedding_dimensions') or 'native'} dimensions), but the configured backend uses "
+            f"{expected['embedding_model']} ({expected['embedding_dimensions'] or 'native'} dimensions). "
+            f"Restore the embedding settings or re-index the documents."
+        )
+
+
+def _fit_to_limit(texts: List[str]) -> Tuple[List[str], List[int]]:
+    """Return the texts to send, each cut to MAX_TOKENS tokens, and their token counts."""
+    encoder = get_encoder()
+    inputs, counts = [], []
+    for text in texts:
+        tokens = encoder.encode(text, disallowed_special=())
+        if len(tokens) > MAX_TOKENS:
+            logger.warning(f"[Embedding] Truncating a {len(tokens)}-token chunk to {MAX_TOKENS} tokens")
+            tokens = tokens[:MAX_TOKENS]
+            text = encoder.decode(tokens)
+        inputs.append(text)
+        counts.append(len(tokens))
+    return inputs, counts
+
+
+def _pack_batches(token_counts: List[int], max_tokens: int, max_inputs: int) -> List[Tuple[int, int]]:
+    # Contiguous (start, end) ranges, each as large as both ceilings allow.
+    batches = []
+    start, tokens = 0, 0
+    for i, count in enumerate(token_counts):
+        if i > start and (tokens + count > max_tokens or i - start >= max_inputs):
+            batches.append((start, i))
+            start, tokens = i, 0
+        tokens += count
+    if start < len(token_counts):
+        batches.append((start, len(token_counts)))
+    return batches
+
+
+def _retry_delay(error: Exception, attempt: int) -> float:
+    response = getattr(error, "response", None)
+    headers = response.headers if response is not None else {}
+    for header, scale in (("retry-after-ms", 0.001), ("retry-after", 1.0)):
+        try:
+            return min(float(headers[header]) * scale, BACKOFF_MAX_SECONDS)
+        except (KeyError, TypeError, ValueError):
+            pass  # missing, or an HTTP date; fall back to backoff
+    return random.uniform(0, min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * 2 ** attempt))
+
+
+class _RateGate:
+    """Shared pause: one rate-limited request holds back every request that has not started yet."""
+
+    def __init__(self):
+        self.resume_at = 0.0
+
+    def hold(self, seconds: float) -> None:
+        self.resume_at = max(self.resume_at, time.monotonic() + seconds)
+
+    async def wait(self) -> None:
+        while (delay := self.resume_at - time.monotonic()) > 0:
+            await asyncio.sleep(delay)
+
+
+def _decode(response) -> List[Vector]:
+    # base64 is the raw float32 bytes: decoded straight into NumPy, never into Python floats.
+    return [np.frombuffer(base64.b64decode(item.embedding), dtype=np.float32)
+            for item in sorted(response.data, key=lambda item: item.index)]
+
+
+async def _embed_range(aclient: AsyncOpenAI, semaphore: asyncio.Semaphore, gate: _RateGate, inputs: List[str],
+                       start: int, end: int, model: str, dimensions: int, errors: Dict[int, str],
+                       progress: tqdm) -> List[Optional[Vector]]:
+    """Vectors for inputs[start:end]; inputs that could not be embedded are None and listed in `errors`."""
+    error: Optional[Exception] = None
+    for attempt in range(EMBED_MAX_RETRIES + 1):
+        await gate.wait()
+        async with semaphore:
+            try:
+                # `dimensions` is only sent when set: models without it reject the parameter.
+                response = await aclient.embeddings.create(input=inputs[start:end], model=model,
+                                                           encoding_format="base64",
+                                                           **({"dimensions": dimensions} if dimensions else {}))
+                progress.update(end - start)
+                return _decode(response)
+            except Exception as e:
+                error = e
+        if not isinstance(error, RETRYABLE_ERRORS) or attempt == EMBED_MAX_RETRIES:
+            break
+        delay = _retry_delay(error, attempt)
+        if isinstance(error, RateLimitError):
+            gate.hold(delay)
+        logger.warning(f"[Embedding] Inputs {start}-{end} attempt {attempt + 1} failed ({error}); "
+                       f"retrying in {delay:.1f}s")
+        await asyncio.sleep(delay)
+
+    if isinstance(error, SPLITTABLE_ERRORS) and end - start > 1:
+        middle = (start + end) // 2
+        logger.warning(f"[Embedding] Inputs {start}-{end} rejected ({error}); splitting the batch")
+        left, right = await asyncio.gather(
+            _embed_range(aclient, semaphore, gate, inputs, start, middle, model, dimensions, errors, progress),
+            _embed_range(aclient, semaphore, gate, inputs, middle, end, model, dimensions, errors, progress)
+        )
+        return left + right
+
+    logger.error(f"[Embedding] Giving up on inputs {start}-{end}: {error}")
+    for i in range(start, end):
+        errors[i] = str(error)
+    progress.update(end - start)
+    return [None] * (end - start)
+
+
+async def _request_embeddings(api_key: str, inputs: List[str], token_counts: List[int], model: str,
+                              dimensions: int, batch_size: int, batch_tokens: int, concurrency: int,
+                              errors: Dict[int, str]) -> List[Optional[Vector]]:
+    # One vector per input; None where the input failed, with the reason in `errors`.
+    batches = _pack_batches(token_counts, batch_tokens, batch_size)
+    logger.info(f"[Embedding] Embedding {len(inputs)} chunks ({sum(token_counts)} tokens) in {len(batches)} "
+                f"request(s), {concurrency} at a time...")
+
+    # A client per call: its connection pool belongs to the event loop that created it. Its own
+    # retries are off so that _embed_range alone decides on backoff and splitting.
+    aclient = AsyncOpenAI(api_key=api_key, max_retries=0)
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    gate = _RateGate()
+    try:
+        with tqdm(total=len(inputs), desc="Embedding Chunks") as progress:
+            results = await asyncio.gather(*(
+                _embed_range(aclient, semaphore, gate, inputs, start, end, model, dimensions, errors, progress)
+                for start, end in batches
+            ))
+    finally:
+        await aclient.close()
+    return [vector for batch_vectors in results for vector in batch_vectors]
+
+
+class OpenAIBackend(EmbeddingBackend):
+    name = "openai"
+
+    def __init__(self, model: str = OPENAI_EMBEDDING_MODEL, dimensions: int = EMBEDDING_DIMENSIONS,
+                 batch_size: int = MAX_BATCH_INPUTS, batch_tokens: int = MAX_BATCH_TOKENS,
+                 concurrency: int = EMBED_CONCURRENCY):
+        # Checked here rather than at import, so the local backend works without a key.
+        self.api_key = os.getenv("OPENAI_API_KEY")
+        if not self.api_key:
+            raise ValueError("OPENAI_API_KEY not found in environment variables. Please set it in .env file.")
+        if dimensions and not model.startswith(DIMENSIONS_MODEL_PREFIX):
+            raise ValueError(f"{model} does not support EMBEDDING_DIMENSIONS; use a {DIMENSIONS_MODEL_PREFIX} model "
+                             f"or set it to 0.")
+        self.model = model
+        self.dimensions = dimensions
+        # Questions reuse one client and its connection pool; ingestion opens an async one per run.
+        self.client = OpenAI(api_key=self.api_key, max_retries=EMBED_MAX_RETRIES)
+        self.batch_size = batch_size
+        self.batch_tokens = batch_tokens
+        self.concurrency = concurrency
+
+    async def embed(self, texts: List[str], errors: Dict[int, str]) -> List[Optional[Vector]]:
+        inputs, token_counts = _fit_to_limit(texts)
+        return await _request_embeddings(self.api_key, inputs, token_counts, self.model, self.dimensions,
+                                         self.batch_size, self.batch_tokens, self.concurrency, errors)
+
+    def embed_query(self, text: str) -> List[float]:
+        inputs, _ = _fit_to_limit([text])
+        response = self.client.embeddings.create(input=inputs, model=self.model, encoding_format="base64",
+                                                 **({"dimensions": self.dimensions} if self.dimensions else {}))
+        return _decode(response)[0].tolist()
+
+
+class SentenceTransformerBackend(EmbeddingBackend):
+    """Embeds on the local CPU; no network access or per-token cost. The model loads on first use."""
+    name = "local"
+
+    def __init__(self, model: str = LOCAL_EMBEDDING_MODEL, runtime: str = LOCAL_RUNTIME,
+                 threads: int = LOCAL_THREADS, batch_size: int = LOCAL_BATCH_SIZE):
+        if runtime not in LOCAL_RUNTIMES:
+            raise ValueError(f"Unknown local embedding runtime: {runtime}. Supported: {', '.join(LOCAL_RUNTIMES)}")
+        self.model_name = model
+        # Quantized vectors differ slightly from full-precision ones, so they get their own cache key.
+        self.model = f"local:{model}" if runtime == "torch" else f"local:{model}:{runtime}"
+        self.runtime = runtime
+        self.threads = threads
+        self.batch_size = batch_size
+        self._encoder = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        with self._lock:
+            if self._encoder is not None:
+                return self._encoder
+            # Imported here: torch and transformers take seconds to import and only this backend uses them.
+            import torch
+            from sentence_transformers import SentenceTransformer
+            if self.threads:
+                torch.set_num_threads(self.threads)
+
+            encoder = None
+            if self.runtime == "onnx":
+                try:
+                    import onnxruntime
+                    options = onnxruntime.SessionOptions()
+                    if self.threads:
+                        options.intra_op_num_threads = self.threads
+                    encoder = SentenceTransformer(self.model_name, device="cpu", backend="onnx",
+                                                  model_kwargs={"session_options": options})
+                except (ImportError, TypeError, ValueError) as e:
+                    logger.warning(f"[Embedding] ONNX Runtime unavailable ({e}); using PyTorch")
+            if encoder is None:
+                encoder = SentenceTransformer(self.model_name, device="cpu")
+                if self.runtime == "int8":
+                    encoder = torch.quantization.quantize_dynamic(encoder, {torch.nn.Linear}, dtype=torch.qint8)
+            logger.info(f"[Embedding] Loaded local model {self.model_name} ({self.runtime}, "
+                        f"{torch.get_num_threads()} threads)")
+            self._encoder = encoder
+            return encoder
+
+    def _encode(self, texts: List[str]) -> List[Vector]:
+        # Inputs longer than the model's max_seq_length are truncated by the tokenizer.
+        vectors = self._load().encode(texts, batch_size=self.batch_size, convert_to_numpy=True,
+                                      normalize_embeddings=True, show_progress_bar=False)
+        return list(vectors.astype(np.float32, copy=False))
+
+    async def embed(self, texts: List[str], errors: Dict[int, str]) -> List[Optional[Vector]]:
+        logger.info(f"[Embedding] Embedding {len(texts)} chunks locally in batches of {self.batch_size}...")
+        try:
+            return await asyncio.to_thread(self._encode, texts)
+        except Exception as e:
+            logger.error(f"[Embedding] Local embedding failed: {e}")
+            errors.update((i, str(e)) for i in range(len(texts)))
+            return [None] * len(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._encode([text])[0].tolist()
+
+
+EMBEDDING_BACKENDS = {backend.name: backend for backend in (OpenAIBackend, SentenceTransformerBackend)}
+
+
+def get_embedding_backend(name: str = DEFAULT_EMBEDDING_BACKEND, **options) -> EmbeddingBackend:
+    try:
+        backend = EMBEDDING_BACKENDS[name]
+    except KeyError:
+        raise ValueError(f"Unknown embedding backend: {name}. Supported: {', '.join(EMBEDDING_BACKENDS)}") from None
+    return backend(**options)
+
+
+@lru_cache(maxsize=None)
+def default_backend() -> EmbeddingBackend:
+    # One instance per process, so a local model is loaded once.
+    return get_embedding_backend()
+
+
+class BackendEmbeddings(Embeddings):
+    """LangChain adapter, so the retriever embeds questions with the backend that embedded the chunks."""
+
+    def __init__(self, backend: Optional[EmbeddingBackend] = None):
+        self.backend = backend or default_backend()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.backend.embed_texts(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.backend.embed_query(text)
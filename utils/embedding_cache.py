@@ -0,0 +1,73 @@
+import os
+import time
+from typing import Dict, Iterable, Sequence, Tuple
+import numpy as np
+from utils.logger import logger
+from utils.sqlite_store import blob_vector, connect, select_in, vector_blob
+
+# Kept outside chroma_store/ so rebuilding the vector store does not mean re-embedding.
+EMBEDDING_CACHE_DB = os.path.join("embedding_cache", "embeddings.sqlite3")
+EMBEDDING_CACHE_MAX_BYTES = 1024 * 1024 * 1024
+# `dimensions` 0 is the model's native size (see EmbeddingBackend); vectors are float32 blobs.
+SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS embeddings ("
+    " model TEXT NOT NULL, dimensions INTEGER NOT NULL, hash TEXT NOT NULL, vector BLOB NOT NULL,"
+    " last_used REAL NOT NULL, PRIMARY KEY (model, dimensions, hash))",
+    "CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used)",
+)
+
+# Lookups since the process started, for hit_ratio().
+_stats = {"hits": 0, "lookups": 0}
+
+
+def get_cached(model: str, dimensions: int, hashes: Sequence[str]) -> Dict[str, np.ndarray]:
+    """Return the cached float32 vectors for `hashes` (text hashes, see utils.chunks.content_hash)."""
+    found: Dict[str, np.ndarray] = {}
+    unique = list(set(hashes))
+    if unique and os.path.exists(EMBEDDING_CACHE_DB):
+        with connect(EMBEDDING_CACHE_DB, SCHEMA) as conn:
+            rows = select_in(conn, "SELECT hash, vector FROM embeddings WHERE model = ? AND dimensions = ?"
+                                   " AND hash IN ({keys})", unique, (model, dimensions))
+            found.update((digest, blob_vector(blob)) for digest, blob in rows)
+            # Touch hits so eviction drops the least recently used vectors first.
+            conn.executemany("UPDATE embeddings SET last_used = ? WHERE model = ? AND dimensions = ? AND hash = ?",
+                             [(time.time(), model, dimensions, digest) for digest in found])
+
+    _stats["hits"] += len(found)
+    _stats["lookups"] += len(unique)
+    if unique:
+        logger.info(f"[Embedding Cache] {len(found)}/{len(unique)} hits ({len(found) / len(unique):.0%}) for {model}")
+    return found
+
+
+def store_cached(model: str, dimensions: int, items: Iterable[Tuple[str, Sequence[float]]]) -> None:
+    now = time.time()
+    rows = [(model, dimensions, digest, vector_blob(vector), now) for digest, vector in items]
+    if not rows:
+        return
+    with connect(EMBEDDING_CACHE_DB, SCHEMA) as conn:
+        conn.executemany(
+            "INSERT OR REPLACE INTO embeddings (model, dimensions, hash, vector, last_used) VALUES (?, ?, ?, ?, ?)",
+            rows
+        )
+    evict()
+
+
+def evict(max_bytes: int = EMBEDDING_CACHE_MAX_BYTES) -> None:
+    """Drop the least recently used vectors until the stored vectors fit in `max_bytes`."""
+    with connect(EMBEDDING_CACHE_DB, SCHEMA) as conn:
+        total = conn.execute("SELECT COALESCE(SUM(LENGTH(vector)), 0) FROM embeddings").fetchone()[0]
+        if total <= max_bytes:
+            return
+        deleted = conn.execute(
+            "DELETE FROM embeddings WHERE rowid IN ("
+            " SELECT rowid FROM (SELECT rowid, SUM(LENGTH(vector)) OVER (ORDER BY last_used DESC, rowid DESC) AS kept"
+            " FROM embeddings) WHERE kept > ?)",
+            (max_bytes,)
+        ).rowcount
+    logger.info(f"[Embedding Cache] Evicted {deleted} vectors to stay under {max_bytes} bytes")
+
+
+def hit_ratio() -> float:
+    """Share of cache lookups answered from disk since the process started."""
+    return _stats["hits"] / _stats["lookups"] if _stats["lookups"] else 0.0
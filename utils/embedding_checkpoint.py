@@ -0,0 +1,55 @@
+import os
+from typing import Dict, Iterable, Sequence, Tuple
+import numpy as np
+from utils.logger import logger
+from utils.sqlite_store import blob_vector, connect, select_in, vector_blob
+
+# Vectors of an ingestion job in progress, keyed by document (file digest), so a rerun after a
+# crash resumes after the last completed batch; a document's rows are dropped once it is fully
+# stored. The embedding cache also keeps finished batches, but it cannot stand in for this: it
+# can be turned off (use_cache=False), and it is shared by all documents and evicted least
+# recently used, so a large job can push out its own early batches before it fails.
+CHECKPOINT_DB = os.path.join("chroma_store", "embedding_checkpoints.sqlite3")
+# Chunks embedded (and then stored) per checkpoint: a crash loses at most one batch of work,
+# while each batch is still large enough for the backend's concurrent requests.
+CHECKPOINT_EVERY_CHUNKS = 2048
+SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS checkpoints ("
+    " document TEXT NOT NULL, model TEXT NOT NULL, dimensions INTEGER NOT NULL, hash TEXT NOT NULL,"
+    " vector BLOB NOT NULL, PRIMARY KEY (document, model, dimensions, hash))",
+)
+
+
+def load_checkpoint(document: str, model: str, dimensions: int, hashes: Sequence[str]) -> Dict[str, np.ndarray]:
+    """Float32 vectors already embedded for `document`, by text hash (see utils.chunks.content_hash)."""
+    found: Dict[str, np.ndarray] = {}
+    unique = list(set(hashes))
+    if not unique or not os.path.exists(CHECKPOINT_DB):
+        return found
+    with connect(CHECKPOINT_DB, SCHEMA) as conn:
+        rows = select_in(conn, "SELECT hash, vector FROM checkpoints WHERE document = ? AND model = ?"
+                               " AND dimensions = ? AND hash IN ({keys})", unique, (document, model, dimensions))
+        found.update((digest, blob_vector(blob)) for digest, blob in rows)
+    if found:
+        logger.info(f"[Embedding Checkpoint] Resuming {document[:12]}: {len(found)} vectors restored")
+    return found
+
+
+def save_checkpoint(document: str, model: str, dimensions: int, items: Iterable[Tuple[str, np.ndarray]]) -> None:
+    rows = [(document, model, dimensions, digest, vector_blob(vector)) for digest, vector in items]
+    if not rows:
+        return
+    # One transaction per batch: a batch is checkpointed completely or not at all.
+    with connect(CHECKPOINT_DB, SCHEMA) as conn:
+        conn.executemany(
+            "INSERT OR REPLACE INTO checkpoints (document, model, dimensions, hash, vector) VALUES (?, ?, ?, ?, ?)",
+            rows
+        )
+
+
+def clear_checkpoint(document: str) -> None:
+    """Drop `document`'s checkpoint once all of its vectors are stored."""
+    if not os.path.exists(CHECKPOINT_DB):
+        return
+    with connect(CHECKPOINT_DB, SCHEMA) as conn:
+        conn.execute("DELETE FROM checkpoints WHERE document = ?", (document,))
@@ -1,48 +1,148 @@
-import os
-import time
-from typing import List, Dict, Any
-from tqdm import tqdm
-from dotenv import load_dotenv
-from openai import OpenAI
+import warnings
+from dataclasses import dataclass
+from typing import Callable, List, Dict, Any, Optional, Set, Union
+import numpy as np
 from langchain.docstore.document import Document
+from utils.chunks import content_hash
+from utils.embedding_backends import EmbeddingBackend, OpenAIBackend, Vector, default_backend, run_sync
+from utils.embedding_cache import get_cached, store_cached
+from utils.embedding_checkpoint import CHECKPOINT_EVERY_CHUNKS, load_checkpoint, save_checkpoint
 from utils.logger import logger
 
-# Load environment variables and initialize client
-load_dotenv()
-api_key = os.getenv("OPENAI_API_KEY")
-if not api_key:
-    raise ValueError("OPENAI_API_KEY not found in environment variables. Please set it in .env file.")
 
-client = OpenAI(api_key=api_key)
+@dataclass
+class EmbeddedChunks:
+    """
+    Chunks and their embeddings: row i of the float32 matrix `vectors` belongs to chunks[i].
+    `space` is the embedding model and dimensions (EmbeddingBackend.space) of the vectors.
+    """
+    chunks: List[Document]
+    vectors: np.ndarray
+    space: Dict[str, Any]
 
-MAX_TOKENS = 8191
+    def __len__(self) -> int:
+        return len(self.chunks)
 
-def embed_documents(documents: List[Document], model: str = "text-embedding-ada-002", batch_size: int = 10) -> List[Dict[str, Any]]:
-    logger.info(f"[Embedding] Embedding {len(documents)} chunks in batches of {batch_size}...")
 
-    embeddings = []
+def _unseen(documents: List[Document], seen_hashes: Set[str]) -> List[Document]:
+    # One document per content hash that is not in the store yet; chunks without a hash are kept.
+    seen = set(seen_hashes)
+    unseen = []
+    for doc in documents:
+        digest = doc.metadata.get("content_hash")
+        if digest is not None:
+            if digest in seen:
+                continue
+            seen.add(digest)
+        unseen.append(doc)
+    return unseen
+
+
+def _batch(documents: List[Document], vectors: List[Optional[Vector]], rows: List[int],
+           space: Dict[str, Any]) -> EmbeddedChunks:
+    kept = [i for i in rows if vectors[i] is not None]
+    matrix = np.stack([vectors[i] for i in kept]) if kept else np.empty((0, 0), dtype=np.float32)
+    return EmbeddedChunks(chunks=[documents[i] for i in kept], vectors=matrix, space=space)
+
+
+def _resolve_backend(backend: Union[EmbeddingBackend, str, None], model: Optional[str],
+                     batch_size: Optional[int]) -> EmbeddingBackend:
+    # Callers written for embed_documents(documents, model, batch_size) get the OpenAI backend they asked for.
+    if isinstance(backend, str):
+        backend, model = None, backend
+    if model is None and batch_size is None:
+        return backend or default_backend()
+    if backend is not None:
+        raise TypeError("Pass either backend or the deprecated model/batch_size, not both.")
+    warnings.warn("model and batch_size are deprecated; pass backend=OpenAIBackend(model=..., batch_size=...)",
+                  DeprecationWarning, stacklevel=2)
+    options = {"model": model} if model is not None else {}
+    if batch_size is not None:
+        options["batch_size"] = batch_size
+    return OpenAIBackend(**options)
+
+
+async def aembed_documents(documents: List[Document], backend: Optional[EmbeddingBackend] = None,
+                           seen_hashes: Optional[Set[str]] = None, use_cache: bool = True,
+                           failed: Optional[List[Dict[str, Any]]] = None, checkpoint: Optional[str] = None,
+                           on_batch: Optional[Callable[[EmbeddedChunks], None]] = None,
+                           model: Optional[str] = None, batch_size: Optional[int] = None) -> EmbeddedChunks:
+    """
+    Embed `documents` with `backend` (default: utils.embedding_backends.default_backend).
+    With `use_cache`, vectors already in the on-disk embedding cache are not computed again,
+    and new ones are added to it. Results keep the order of `documents`; every chunk is either
+    in the result or added to `failed` as {"text", "metadata", "error"}. Vectors are returned
+    as one contiguous float32 matrix, never as Python floats.
+
+    With `checkpoint` (a document key, e.g. its file digest), chunks are embedded in batches
+    of CHECKPOINT_EVERY_CHUNKS and each finished batch is saved to the on-disk checkpoint
+    first, so a rerun with the same key only embeds what is missing. `on_batch` receives the
+    vectors restored from cache or checkpoint and then each finished batch, as they complete.
+
+    `model` and `batch_size` (or a model name in place of `backend`) are deprecated; they
+    select an OpenAIBackend with those settings.
+    """
+    backend = _resolve_backend(backend, model, batch_size)
+    if seen_hashes is not None:
+        total = len(documents)
+        documents = _unseen(documents, seen_hashes)
+        logger.info(f"[Embedding] Skipping {total - len(documents)} of {total} chunks already embedded")
     texts = [doc.page_content for doc in documents]
     metadatas = [doc.metadata for doc in documents]
+    hashes = [doc.metadata.get("content_hash") or content_hash(doc.page_content) for doc in documents]
+
+    vectors: List[Optional[Vector]] = [None] * len(documents)
+    if use_cache:
+        cached = get_cached(backend.model, backend.dimensions, hashes)
+        vectors = [cached.get(digest) for digest in hashes]
+    if checkpoint:
+        restored = load_checkpoint(checkpoint, backend.model, backend.dimensions,
+                                   [digest for digest, vector in zip(hashes, vectors) if vector is None])
+        vectors = [vector if vector is not None else restored.get(digest) for digest, vector in zip(hashes, vectors)]
+
+    ready = [i for i, vector in enumerate(vectors) if vector is not None]
+    if on_batch and ready:
+        on_batch(_batch(documents, vectors, ready, backend.space))
+
+    pending = [i for i, vector in enumerate(vectors) if vector is None]
+    step = CHECKPOINT_EVERY_CHUNKS if checkpoint else max(len(pending), 1)
+    failures = 0
+    for offset in range(0, len(pending), step):
+        group = pending[offset:offset + step]
+        errors: Dict[int, str] = {}
+        fetched = await backend.embed([texts[i] for i in group], errors)
+        for i, vector in zip(group, fetched):
+            vectors[i] = vector
+        if failed is not None:
+            failed.extend({"text": texts[group[position]], "metadata": metadatas[group[position]], "error": error}
+                          for position, error in sorted(errors.items()))
+        failures += len(errors)
+        done = [(hashes[i], vectors[i]) for i in group if vectors[i] is not None]
+        if use_cache:
+            store_cached(backend.model, backend.dimensions, done)
+        if checkpoint:
+            save_checkpoint(checkpoint, backend.model, backend.dimensions, done)
+            logger.info(f"[Embedding] Checkpointed {offset + len(group)} of {len(pending)} chunks")
+        if on_batch:
+            on_batch(_batch(documents, vectors, group, backend.space))
+    if failures:
+        logger.error(f"[Embedding] {failures} of {len(documents)} chunks could not be embedded")
+
+    embedded = _batch(documents, vectors, list(range(len(documents))), backend.space)
+    logger.info(f"[Embedding] Completed. Total embeddings: {len(embedded)} ({embedded.vectors.nbytes / 2 ** 20:.1f} MB)")
+    return embedded
+
 
-    for i in tqdm(range(0, len(texts), batch_size), desc="Embedding Chunks"):
-        batch_texts = texts[i:i + batch_size]
-        batch_metadatas = metadatas[i:i + batch_size]
-
-        try:
-            response = client.embeddings.create(
-                input=batch_texts,
-                model=model
-            )
-            for embedding_data, text, metadata in zip(response.data, batch_texts, batch_metadatas):
-                embeddings.append({
-                    "embedding": embedding_data.embedding,
-                    "text": text,
-                    "metadata": metadata
-                })
-        except Exception as e:
-            logger.error(f"[Embedding] Error on batch {i}-{i + batch_size}: {e}")
-            time.sleep(2)
-            continue
-
-    logger.info(f"[Embedding] Completed. Total embeddings: {len(embeddings)}")
-    return embeddings
+def embed_documents(documents: List[Document], backend: Optional[EmbeddingBackend] = None,
+                    seen_hashes: Optional[Set[str]] = None, use_cache: bool = True,
+                    failed: Optional[List[Dict[str, Any]]] = None, checkpoint: Optional[str] = None,
+                    on_batch: Optional[Callable[[EmbeddedChunks], None]] = None,
+                    model: Optional[str] = None, batch_size: Optional[int] = None) -> EmbeddedChunks:
+    """
+    Synchronous entry point; runs aembed_documents. With `seen_hashes`, chunks whose
+    metadata["content_hash"] is in the set, or repeats an earlier chunk in `documents`,
+    are not embedded again. Model, batching and concurrency are settings of the backend
+    (see utils.embedding_backends).
+    """
+    return run_sync(aembed_documents(documents, backend, seen_hashes, use_cache, failed, checkpoint, on_batch,
+                                     model, batch_size))
@@ -0,0 +1,91 @@
+import re
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+# Levels of the section path, outermost first. A marker replaces everything at its level and below.
+HEADING, SECTION, PARAGRAPH, CLAUSE = range(4)
+
+HEADING_KEYWORD = re.compile(r"^(PART|CHAPTER|SCHEDULE|ARTICLE|ANNEXURE|APPENDIX)\s+[\dIVXLC]+[A-Z]?\b.*$", re.IGNORECASE)
+# A provision header ("Section 302. Punishment for murder", "Sec. 12:" or "S. 4" alone), not a
+# reference such as "Section 302 IPC and ..." that a wrapped sentence happens to start with.
+SECTION_MARKER = re.compile(r"^(?:Section|Sec\.|S\.)\s*(\d+[A-Z]?(?:\(\w{1,4}\))*)\s*(?:[.:—–]|-(?!\w)|$)",
+                            re.IGNORECASE)
+PARAGRAPH_MARKER = re.compile(r"^(\d{1,3})\.\s+\S")
+CLAUSE_MARKER = re.compile(r"^\(([a-z]{1,2}|[ivxlc]{1,6}|\d{1,3})\)\s+\S")
+# A marker only opens a unit at the start of a line that follows a blank line, the end of a
+# sentence or list item, or another marker; otherwise it is a wrapped line of running text.
+SENTENCE_END = re.compile(r"[.:;!?)\]\"'”’—–]\s*$")
+# All-caps lines such as JUDGMENT, ORDER or FACTS OF THE CASE.
+MAX_HEADING_CHARS = 80
+MIN_HEADING_LETTERS = 3
+
+# (char_start, char_end, section path, enclosing heading) of one structural unit of the text.
+Unit = Tuple[int, int, str, str]
+
+
+def classify_line(line: str) -> Optional[Tuple[int, str]]:
+    """Return (level, label) when `line` opens a heading, section, numbered paragraph or clause."""
+    stripped = line.strip()
+    if not stripped:
+        return None
+
+    match = SECTION_MARKER.match(stripped)
+    if match:
+        return SECTION, f"Section {match.group(1)}"
+    match = PARAGRAPH_MARKER.match(stripped)
+    if match:
+        return PARAGRAPH, f"¶{match.group(1)}"
+    match = CLAUSE_MARKER.match(stripped)
+    if match:
+        return CLAUSE, f"({match.group(1)})"
+
+    letters = [ch for ch in stripped if ch.isalpha()]
+    if HEADING_KEYWORD.match(stripped) or (
+        len(stripped) <= MAX_HEADING_CHARS and len(letters) >= MIN_HEADING_LETTERS
+        and all(ch.isupper() for ch in letters)
+    ):
+        return HEADING, " ".join(stripped.split())
+    return None
+
+
+def iter_units(lines: Iterable[str], max_chars: int = 0) -> Iterator[Tuple[int, int, str, str, bool]]:
+    """
+    find_units over text that arrives line by line (line breaks kept), so it never has to be
+    joined: each unit is yielded, with a final flag, as soon as the next marker closes it. With
+    `max_chars`, a longer unit is also yielded in parts cut at line breaks; all but its last
+    part are flagged not final.
+    """
+    path: List[Tuple[int, str]] = []
+    unit_start, unit_path, unit_heading = 0, "", ""
+    offset = 0
+    has_text = False
+    continued = False  # the open unit is the rest of one already partly yielded
+    boundary = True  # the start of the text, a blank line, a sentence end or a marker precedes
+    for line in lines:
+        marker = classify_line(line) if boundary else None
+        boundary = marker is not None or not line.strip() or bool(SENTENCE_END.search(line))
+        if marker is not None:
+            level, label = marker
+            if has_text or continued:
+                yield unit_start, offset, unit_path, unit_heading, True
+            path = [(lvl, name) for lvl, name in path if lvl < level] + [(level, label)]
+            unit_start, unit_path = offset, " > ".join(name for _, name in path)
+            unit_heading = path[0][1] if path[0][0] == HEADING else ""
+            has_text = continued = False
+        has_text = has_text or bool(line.strip())
+        offset += len(line)
+        if max_chars and has_text and offset - unit_start >= max_chars:
+            yield unit_start, offset, unit_path, unit_heading, False
+            unit_start, has_text, continued = offset, False, True
+
+    if has_text or continued:
+        yield unit_start, offset, unit_path, unit_heading, True
+
+
+def find_units(text: str) -> List[Unit]:
+    """
+    Split `text` at lines that open a heading, section, numbered paragraph or clause (only
+    where SENTENCE_END allows one). Each unit runs to the next such line and carries its
+    section path, e.g. "JUDGMENT > ¶12 > (a)", and the heading it falls under. Text with no
+    recognisable structure is a single unit.
+    """
+    return [unit[:4] for unit in iter_units(text.splitlines(keepends=True))]
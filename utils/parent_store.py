@@ -0,0 +1,37 @@
+import os
+import json
+from typing import Dict, Iterable, List
+from langchain.docstore.document import Document
+from utils.logger import logger
+from utils.sqlite_store import connect, select_in
+
+# Lives next to the Chroma files so deleting chroma_store/ resets both.
+PARENT_DB = os.path.join("chroma_store", "parents.sqlite3")
+SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS parents ("
+    " id TEXT PRIMARY KEY, source TEXT NOT NULL, text TEXT NOT NULL, metadata TEXT NOT NULL)",
+    "CREATE INDEX IF NOT EXISTS parents_source ON parents (source)",
+)
+
+
+def store_parents(parents: Iterable[Document]) -> int:
+    """
+    Persist parent spans (not embedded) keyed by their metadata["parent_id"], a content hash;
+    a span already stored under its id keeps its first row.
+    """
+    rows = [
+        (doc.metadata["parent_id"], str(doc.metadata.get("source", "")), doc.page_content, json.dumps(doc.metadata))
+        for doc in parents
+    ]
+    with connect(PARENT_DB, SCHEMA) as conn:
+        conn.executemany("INSERT OR IGNORE INTO parents (id, source, text, metadata) VALUES (?, ?, ?, ?)", rows)
+    logger.info(f"[Parent Store] Stored {len(rows)} parent spans")
+    return len(rows)
+
+
+def get_parents(parent_ids: List[str]) -> Dict[str, Document]:
+    if not parent_ids or not os.path.exists(PARENT_DB):
+        return {}
+    with connect(PARENT_DB, SCHEMA) as conn:
+        rows = list(select_in(conn, "SELECT id, text, metadata FROM parents WHERE id IN ({keys})", set(parent_ids)))
+    return {parent_id: Document(page_content=text, metadata=json.loads(metadata)) for parent_id, text, metadata in rows}
@@ -0,0 +1,224 @@
+import os
+import sys
+import gzip
+import json
+import hashlib
+import inspect
+import functools
+from typing import Callable, Iterable, Iterator, List, Optional, Sequence, Tuple
+from langchain.docstore.document import Document
+from utils.logger import logger
+
+PARSE_CACHE_DIR = "parse_cache"
+PARSE_CACHE_MAX_BYTES = 512 * 1024 * 1024
+READ_BLOCK_SIZE = 1024 * 1024
+
+
+def file_digest(file_path: str) -> str:
+    sha = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(READ_BLOCK_SIZE), b""):
+            sha.update(block)
+    return sha.hexdigest()
+
+
+@functools.lru_cache(maxsize=None)
+def _code_fingerprint(module_names: Sequence[str], version: str) -> str:
+    # Hash the extractor sources themselves, so editing a loader invalidates its entries
+    # even when nobody remembers to bump the version string.
+    sha = hashlib.sha256(version.encode("utf-8"))
+    for name in module_names:
+        module_file = getattr(sys.modules.get(name), "__file__", None)
+        if module_file and os.path.exists(module_file):
+            with open(module_file, "rb") as f:
+                sha.update(f.read())
+    return sha.hexdigest()[:16]
+
+
+def _entry_path(kind: str, fingerprint: str, key: str) -> str:
+    return os.path.join(PARSE_CACHE_DIR, f"{kind}-{fingerprint}-{key}.jsonl.gz")
+
+
+def iter_cached(path: str, file_path: str) -> Iterator[Document]:
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        for line in f:
+            entry = json.loads(line)
+            metadata = entry["metadata"]
+            if "source" in metadata:
+                metadata["source"] = file_path
+            yield Document(page_content=entry["page_content"], metadata=metadata)
+
+
+def load_cached(path: str, file_path: str) -> Optional[List[Document]]:
+    if not os.path.exists(path):
+        return None
+    try:
+        documents = list(iter_cached(path, file_path))
+        os.utime(path)  # mtime doubles as the LRU timestamp
+        return documents
+    except Exception as e:
+        logger.warning(f"[Parse Cache] Dropping unreadable entry {path}: {e}")
+        _remove(path)
+        return None
+
+
+def store_cached(path: str, documents: Iterable[Document]) -> None:
+    for _ in store_through(path, documents):
+        pass
+
+
+def store_through(path: str, documents: Iterable[Document]) -> Iterator[Document]:
+    """
+    Yield `documents` while writing them to the entry at `path`. The entry is only
+    published once the stream is exhausted; an abandoned stream leaves nothing behind.
+    """
+    os.makedirs(PARSE_CACHE_DIR, exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    completed = False
+    try:
+        with gzip.open(tmp_path, "wt", encoding="utf-8", compresslevel=6) as f:
+            for doc in documents:
+                f.write(json.dumps({"page_content": doc.page_content, "metadata": doc.metadata}))
+                f.write("\n")
+                yield doc
+        completed = True
+    finally:
+        if completed:
+            os.replace(tmp_path, path)
+        else:
+            _remove(tmp_path)
+
+
+def _remove(path: str) -> None:
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def drop_stale(kind: str, fingerprint: str) -> None:
+    prefix = f"{kind}-"
+    current = f"{kind}-{fingerprint}-"
+    for name in os.listdir(PARSE_CACHE_DIR):
+        if name.startswith(prefix) and not name.startswith(current):
+            _remove(os.path.join(PARSE_CACHE_DIR, name))
+
+
+def evict(max_bytes: int = PARSE_CACHE_MAX_BYTES, directory: str = PARSE_CACHE_DIR) -> None:
+    entries = []
+    for name in os.listdir(directory):
+        path = os.path.join(directory, name)
+        try:
+            stat = os.stat(path)
+        except OSError:
+            continue
+        entries.append((stat.st_mtime, stat.st_size, path))
+
+    total = sum(size for _, size, _ in entries)
+    if total <= max_bytes:
+        return
+    for _, size, path in sorted(entries):
+        _remove(path)
+        total -= size
+        logger.info(f"[Cache] Evicted {path}")
+        if total <= max_bytes:
+            break
+
+
+def _resolve_entry(kind: str, version: str, module_names: Sequence[str], ignore: Sequence[str],
+                   context: Optional[Callable[[dict], dict]], file_path: str, options: dict) -> Tuple[str, str]:
+    fingerprint = _code_fingerprint(tuple(module_names), version)
+    variant = {k: v for k, v in options.items() if k not in ignore}
+    if context is not None:
+        variant.update(context(options))
+    variant = dict(sorted(variant.items()))
+    key = hashlib.sha256(f"{file_digest(file_path)}:{json.dumps(variant, default=str)}".encode("utf-8")).hexdigest()
+    return _entry_path(kind, fingerprint, key), fingerprint
+
+
+def _bound_options(signature: inspect.Signature, file_path: str, args: tuple, options: dict) -> dict:
+    # Options by name however they were passed, so load_pdf(path, 4) and load_pdf(path, workers=4) share an entry.
+    arguments = signature.bind(file_path, *args, **options).arguments
+    return dict(list(arguments.items())[1:])
+
+
+def _after_store(kind: str, fingerprint: str) -> None:
+    drop_stale(kind, fingerprint)
+    evict()
+
+
+def cached_loader(kind: str, version: str, depends_on: Sequence[str] = (), ignore: Sequence[str] = (),
+                  context: Optional[Callable[[dict], dict]] = None) -> Callable:
+    """
+    Decorator for loaders with the signature fn(file_path, **options) -> List[Document]; options
+    may also be passed by position. Entries are keyed by the SHA-256 of the file bytes, the loader
+    code fingerprint and every option not listed in `ignore` (options that do not change the
+    output, such as worker counts).
+    `context(options)` adds keys for what changes the output without being an option, such as
+    whether an external tool is installed.
+    """
+    def decorator(loader: Callable[..., List[Document]]) -> Callable[..., List[Document]]:
+        signature = inspect.signature(loader)
+
+        @functools.wraps(loader)
+        def wrapper(file_path: str, *args, **options) -> List[Document]:
+            try:
+                path, fingerprint = _resolve_entry(kind, version, (loader.__module__, *depends_on), ignore, context,
+                                                   file_path, _bound_options(signature, file_path, args, options))
+            except OSError:
+                return loader(file_path, *args, **options)
+
+            documents = load_cached(path, file_path)
+            if documents is not None:
+                logger.info(f"[Parse Cache] Hit for {file_path} ({len(documents)} documents)")
+                return documents
+
+            documents = loader(file_path, *args, **options)
+            try:
+                store_cached(path, documents)
+                _after_store(kind, fingerprint)
+            except Exception as e:
+                logger.warning(f"[Parse Cache] Could not cache {file_path}: {e}")
+            return documents
+
+        return wrapper
+    return decorator
+
+
+def cached_stream(kind: str, version: str, depends_on: Sequence[str] = (), ignore: Sequence[str] = (),
+                  context: Optional[Callable[[dict], dict]] = None) -> Callable:
+    """
+    Generator counterpart of cached_loader. Hits are read back one document at a time and
+    misses are written through as they are produced, so neither side holds the whole file.
+    Use the same kind/version as the list loader to share its entries.
+    """
+    def decorator(loader: Callable[..., Iterator[Document]]) -> Callable[..., Iterator[Document]]:
+        signature = inspect.signature(loader)
+
+        @functools.wraps(loader)
+        def wrapper(file_path: str, *args, **options) -> Iterator[Document]:
+            try:
+                path, fingerprint = _resolve_entry(kind, version, (loader.__module__, *depends_on), ignore, context,
+                                                   file_path, _bound_options(signature, file_path, args, options))
+            except OSError:
+                yield from loader(file_path, *args, **options)
+                return
+
+            if os.path.exists(path):
+                logger.info(f"[Parse Cache] Streaming hit for {file_path}")
+                os.utime(path)
+                try:
+                    yield from iter_cached(path, file_path)
+                except (OSError, EOFError, ValueError) as e:
+                    _remove(path)
+                    raise RuntimeError(f"Parse cache entry for {file_path} is corrupt and was dropped; retry") from e
+                return
+
+            yield from store_through(path, loader(file_path, *args, **options))
+            try:
+                _after_store(kind, fingerprint)
+            except Exception as e:
+                logger.warning(f"[Parse Cache] Could not finalise cache for {file_path}: {e}")
+
+        return wrapper
+    return decorator
@@ -0,0 +1,130 @@
+from typing import Dict, Iterator, List, Optional, Tuple
+import pdfplumber
+from pypdf import PdfReader
+
+# A page whose text is shorter than this, or looks garbled, counts as having no usable text layer.
+MIN_TEXT_CHARS = 20
+MIN_PRINTABLE_RATIO = 0.95
+MIN_ALNUM_RATIO = 0.5
+# Long runs without whitespace are the usual sign of an extractor that lost word spacing.
+MIN_WHITESPACE_RATIO = 0.03
+
+# (page index, text, engine that produced it)
+ExtractedPage = Tuple[int, str, str]
+
+
+def is_usable_text(text: str) -> bool:
+    stripped = text.strip()
+    if len(stripped) < MIN_TEXT_CHARS:
+        return False
+    if "\ufffd" in stripped or "(cid:" in stripped:
+        return False
+
+    printable = sum(1 for ch in stripped if ch.isprintable() or ch.isspace())
+    spaces = sum(1 for ch in stripped if ch.isspace())
+    alnum = sum(1 for ch in stripped if ch.isalnum())
+    if printable / len(stripped) < MIN_PRINTABLE_RATIO:
+        return False
+    if alnum / max(1, len(stripped) - spaces) < MIN_ALNUM_RATIO:
+        return False
+    return spaces / len(stripped) >= MIN_WHITESPACE_RATIO
+
+
+class PdfEngine:
+    """
+    A text extractor for PDF pages. iter_pages must open the file itself, so that ranges can be
+    handed to separate worker processes, and must not keep per-page state alive once a page
+    has been yielded, so that streaming callers stay in bounded memory.
+    """
+    name = ""
+
+    def page_count(self, file_path: str) -> int:
+        raise NotImplementedError
+
+    def iter_pages(self, file_path: str, start: int = 0, end: Optional[int] = None) -> Iterator[ExtractedPage]:
+        raise NotImplementedError
+
+    def extract_range(self, file_path: str, start: int, end: int) -> List[ExtractedPage]:
+        return list(self.iter_pages(file_path, start, end))
+
+
+def _pdfplumber_page_text(pdf, page_num: int) -> str:
+    page = pdf.pages[page_num]
+    try:
+        return page.extract_text() or ""
+    finally:
+        # Drops the page's parsed layout objects; without this pdfplumber keeps every page's chars alive.
+        page.close()
+
+
+class PdfplumberEngine(PdfEngine):
+    """Full layout analysis: slowest, but the most faithful reading order."""
+    name = "pdfplumber"
+
+    def page_count(self, file_path: str) -> int:
+        with pdfplumber.open(file_path) as pdf:
+            return len(pdf.pages)
+
+    def iter_pages(self, file_path: str, start: int = 0, end: Optional[int] = None) -> Iterator[ExtractedPage]:
+        with pdfplumber.open(file_path) as pdf:
+            for page_num in range(start, len(pdf.pages) if end is None else end):
+                yield page_num, _pdfplumber_page_text(pdf, page_num), self.name
+
+
+class PypdfEngine(PdfEngine):
+    """Content-stream text only; several times faster than pdfplumber on plain-text filings."""
+    name = "pypdf"
+
+    def page_count(self, file_path: str) -> int:
+        return len(PdfReader(file_path).pages)
+
+    def iter_pages(self, file_path: str, start: int = 0, end: Optional[int] = None) -> Iterator[ExtractedPage]:
+        reader = PdfReader(file_path)
+        for page_num in range(start, len(reader.pages) if end is None else end):
+            yield page_num, reader.pages[page_num].extract_text() or "", self.name
+
+
+class AutoEngine(PdfEngine):
+    """pypdf first; pages it returns empty or garbled are re-extracted with pdfplumber."""
+    name = "auto"
+
+    def __init__(self):
+        self.fast = PypdfEngine()
+        self.fallback = PdfplumberEngine()
+
+    def page_count(self, file_path: str) -> int:
+        return self.fast.page_count(file_path)
+
+    def iter_pages(self, file_path: str, start: int = 0, end: Optional[int] = None) -> Iterator[ExtractedPage]:
+        pdf = None
+        try:
+            for page_num, text, engine in self.fast.iter_pages(file_path, start, end):
+                if not is_usable_text(text):
+                    # Opened on the first bad page only, so clean text-layer files never pay for it.
+                    pdf = pdf or pdfplumber.open(file_path)
+                    retried = _pdfplumber_page_text(pdf, page_num)
+                    # Keep the fast result when pdfplumber does no better (e.g. a genuinely blank page).
+                    if retried.strip():
+                        text, engine = retried, self.fallback.name
+                yield page_num, text, engine
+        finally:
+            if pdf is not None:
+                pdf.close()
+
+
+PDF_ENGINES: Dict[str, PdfEngine] = {
+    engine.name: engine for engine in (PdfplumberEngine(), PypdfEngine(), AutoEngine())
+}
+DEFAULT_PDF_ENGINE = "auto"
+
+
+def get_pdf_engine(name: str) -> PdfEngine:
+    try:
+        return PDF_ENGINES[name]
+    except KeyError:
+        raise ValueError(f"Unknown PDF engine: {name}. Supported: {', '.join(PDF_ENGINES)}") from None
+
+
+def extract_range(engine_name: str, file_path: str, start: int, end: int) -> List[ExtractedPage]:
+    # Module-level entry point so process pools can pickle it.
+    return get_pdf_engine(engine_name).extract_range(file_path, start, end)
@@ -0,0 +1,133 @@
+import os
+import gzip
+import time
+import hashlib
+from typing import List, Optional
+import pdfplumber
+import pytesseract
+from PIL import Image
+from langchain.docstore.document import Document
+from utils.logger import logger
+from utils.parse_cache import evict
+
+OCR_CACHE_DIR = "ocr_cache"
+OCR_CACHE_MAX_BYTES = 64 * 1024 * 1024
+OCR_LANG = "eng"
+# Tesseract is most accurate around 300 DPI; larger renders only cost time.
+OCR_RENDER_RESOLUTION = 300
+OCR_MAX_SIDE = 2500
+OCR_MAX_WORKERS = 4
+# Part of the cache key, so changing preprocessing or language re-runs recognition.
+OCR_CONFIG = f"lang={OCR_LANG};max_side={OCR_MAX_SIDE};binarize=otsu"
+# A missing Tesseract is probed again after this long, so installing it does not need a restart.
+OCR_RECHECK_SECONDS = 60
+
+_ocr_missing_since: Optional[float] = None
+_ocr_found = False
+
+
+def ocr_available() -> bool:
+    global _ocr_missing_since, _ocr_found
+    if _ocr_found:
+        return True
+    if _ocr_missing_since is not None and time.monotonic() - _ocr_missing_since < OCR_RECHECK_SECONDS:
+        return False
+    try:
+        pytesseract.get_tesseract_version()
+        _ocr_found = True
+        return True
+    except Exception as e:
+        logger.warning(f"[OCR] Tesseract is not available, scanned pages will be skipped: {e}")
+        _ocr_missing_since = time.monotonic()
+        return False
+
+
+def _otsu_threshold(histogram: List[int]) -> int:
+    total = sum(histogram)
+    weighted_total = sum(level * count for level, count in enumerate(histogram))
+    background, weighted_background = 0, 0.0
+    best_level, best_variance = 127, -1.0
+    for level, count in enumerate(histogram):
+        background += count
+        if background == 0:
+            continue
+        foreground = total - background
+        if foreground == 0:
+            break
+        weighted_background += level * count
+        mean_background = weighted_background / background
+        mean_foreground = (weighted_total - weighted_background) / foreground
+        variance = background * foreground * (mean_background - mean_foreground) ** 2
+        if variance > best_variance:
+            best_level, best_variance = level, variance
+    return best_level
+
+
+def preprocess_image(image: Image.Image) -> Image.Image:
+    """Grayscale, cap the longest side at OCR_MAX_SIDE and binarize with an Otsu threshold."""
+    gray = image.convert("L")
+    if max(gray.size) > OCR_MAX_SIDE:
+        gray.thumbnail((OCR_MAX_SIDE, OCR_MAX_SIDE), Image.LANCZOS)
+    threshold = _otsu_threshold(gray.histogram())
+    return gray.point(lambda value: 255 if value > threshold else 0, mode="1")
+
+
+def image_hash(image: Image.Image) -> str:
+    sha = hashlib.sha256(f"{image.mode}:{image.size}:{OCR_CONFIG}".encode("utf-8"))
+    sha.update(image.tobytes())
+    return sha.hexdigest()
+
+
+def ocr_image(image: Image.Image) -> str:
+    key = image_hash(image)
+    path = os.path.join(OCR_CACHE_DIR, f"{key}.txt.gz")
+    if os.path.exists(path):
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            return f.read()
+
+    text = pytesseract.image_to_string(preprocess_image(image), lang=OCR_LANG)
+
+    os.makedirs(OCR_CACHE_DIR, exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with gzip.open(tmp_path, "wt", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+    return text
+
+
+def ocr_pdf_page(file_path: str, page_num: int) -> str:
+    # Runs inside pool workers: renders and recognises a single 0-based page.
+    with pdfplumber.open(file_path) as pdf:
+        page = pdf.pages[page_num]
+        try:
+            image = page.to_image(resolution=OCR_RENDER_RESOLUTION).original
+        finally:
+            page.close()
+    return ocr_image(image)
+
+
+def prune_cache() -> None:
+    if os.path.isdir(OCR_CACHE_DIR):
+        evict(OCR_CACHE_MAX_BYTES, directory=OCR_CACHE_DIR)
+
+
+def load_image(file_path: str) -> List[Document]:
+    try:
+        with Image.open(file_path) as image:
+            image.load()
+            text = ocr_image(image)
+        documents = []
+        if text.strip():
+            documents.append(Document(
+                page_content=text,
+                metadata={
+                    "source": file_path,
+                    "page": 1,
+                    "engine": "ocr"
+                }
+            ))
+        logger.info(f"[OCR] Recognised {len(text.split())} words from {file_path}")
+        return documents
+    except Exception as e:
+        logger.error(f"[OCR] Failed to read image {file_path}: {e}")
+        raise RuntimeError(f"Image loading failed for {file_path}") from e
@@ -1,44 +1,160 @@
-from utils.document_loader import load_document
-from utils.chunks import split_loaded_document
-from utils.embedding_generator import embed_documents
-from utils.store_house import store_document
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+from langchain.docstore.document import Document
+from utils.document_loader import iter_document, load_document
+from utils.chunks import GROUPED_METHODS, split_parent_child
+from utils.preprocess import strip_boilerplate
+from utils.embedding_backends import default_backend
+from utils.embedding_checkpoint import clear_checkpoint
+from utils.embedding_generator import EmbeddedChunks, embed_documents
+from utils.store_house import check_collection_space, record_chunks, store_document
+from utils.chunk_store import known_hashes
+from utils.parent_store import store_parents
+from utils.parse_cache import file_digest
 from utils.logger import logger
 
+# Parent spans follow headings, sections, numbered paragraphs and clauses and span page breaks
+# (see utils.chunks.chunk_legal_structure); unstructured text is packed like "packed".
+# Each parent is cut into small child chunks for embedding (see utils.chunks.split_parent_child).
+CHUNK_METHOD = "legal"
 
-def run_pipeline(file_path: str):
+
+@dataclass
+class PipelineResult:
+    """
+    Everything one pipeline run produced, so the UI can preview it without parsing again.
+    `error` is set when a stage failed; the fields of later stages are then left empty.
+    Streaming runs do not keep the parsed pages, so `documents` stays empty and only
+    `page_count` is filled in. `chunks` are the embedded child chunks; `parents` are the
+    larger spans they point to through metadata["parent_id"]. `failed_chunks` lists the
+    chunks that could not be embedded even after retries (see embed_documents); they are not
+    stored, and are embedded again the next time the file is processed.
+    """
+    file_path: str
+    documents: List[Document] = field(default_factory=list)
+    page_count: int = 0
+    boilerplate_tokens_removed: int = 0
+    parents: List[Document] = field(default_factory=list)
+    chunks: List[Document] = field(default_factory=list)
+    embedding_count: int = 0
+    failed_chunks: List[Dict[str, Any]] = field(default_factory=list)
+    timings: Dict[str, float] = field(default_factory=dict)
+    error: Optional[str] = None
+
+    @property
+    def succeeded(self) -> bool:
+        return self.error is None
+
+
+def _counted(documents: Iterable[Document], result: PipelineResult) -> Iterator[Document]:
+    for doc in documents:
+        result.page_count += 1
+        yield doc
+
+
+def run_pipeline(file_path: str, stream: bool = False) -> PipelineResult:
+    """
+    With stream=True pages are parsed lazily and handed straight to the chunker, so peak
+    memory during loading stays flat regardless of page count; load, preprocess and chunk
+    are then timed together as "load+chunk".
+    """
     logger.info(f"[Pipeline] Starting pipeline for file: {file_path}")
+    result = PipelineResult(file_path=file_path)
+    boilerplate: Dict[str, int] = {}
 
-    # 1. Load document and extract content
-    try:
-        documents = load_document(file_path)
-        logger.info(f"[Pipeline] Loaded {len(documents)} document(s).")
-    except Exception as e:
-        logger.error(f"[Pipeline] Document loading failed: {e}")
-        return
+    if stream:
+        # 1+2. Load lazily and chunk as pages arrive
+        try:
+            started = time.perf_counter()
+            pages = strip_boilerplate(_counted(iter_document(file_path), result), boilerplate)
+            result.parents, result.chunks = split_parent_child(file_path, documents=pages, method=CHUNK_METHOD)
+            result.timings["load+chunk"] = time.perf_counter() - started
+            result.boilerplate_tokens_removed = sum(boilerplate.values())
+            logger.info(f"[Pipeline] Streamed {result.page_count} page(s) into {len(result.chunks)} chunks.")
+        except Exception as e:
+            logger.error(f"[Pipeline] Streaming load/chunk failed: {e}")
+            result.error = f"Streaming load/chunk failed: {e}"
+            return result
+    else:
+        # 1. Load document and extract content
+        try:
+            started = time.perf_counter()
+            result.documents = load_document(file_path)
+            result.page_count = len(result.documents)
+            result.timings["load"] = time.perf_counter() - started
+            logger.info(f"[Pipeline] Loaded {len(result.documents)} document(s).")
+        except Exception as e:
+            logger.error(f"[Pipeline] Document loading failed: {e}")
+            result.error = f"Document loading failed: {e}"
+            return result
 
-    # 2. Chunk the document
-    try:
-        chunks = split_loaded_document(file_path)
-        logger.info(f"[Pipeline] Document chunking complete. {len(chunks)} chunks created.")
-    except Exception as e:
-        logger.error(f"[Pipeline] Chunking failed: {e}")
-        return
+        # 1b. Strip repeated headers, footers and page numbers
+        try:
+            started = time.perf_counter()
+            result.documents = list(strip_boilerplate(result.documents, boilerplate))
+            result.boilerplate_tokens_removed = sum(boilerplate.values())
+            result.timings["preprocess"] = time.perf_counter() - started
+        except Exception as e:
+            logger.error(f"[Pipeline] Preprocessing failed: {e}")
+            result.error = f"Preprocessing failed: {e}"
+            return result
 
-    # 3. Generate embeddings
-    try:
-        generated_embeddings = embed_documents(chunks)
-        logger.info(f"[Pipeline] Embedding complete. {len(generated_embeddings)} embeddings generated.")
-    except Exception as e:
-        logger.error(f"[Pipeline] Embedding failed: {e}")
-        return
+        # 2. Chunk the document
+        try:
+            started = time.perf_counter()
+            # Pages are already in memory here, so large documents are chunked in a process pool,
+            # unless the method chunks the file as one group, which a single worker has to do.
+            workers = 1 if CHUNK_METHOD in GROUPED_METHODS else None
+            result.parents, result.chunks = split_parent_child(file_path, documents=result.documents,
+                                                               method=CHUNK_METHOD, workers=workers)
+            result.timings["chunk"] = time.perf_counter() - started
+            logger.info(f"[Pipeline] Document chunking complete. {len(result.chunks)} chunks created.")
+        except Exception as e:
+            logger.error(f"[Pipeline] Chunking failed: {e}")
+            result.error = f"Chunking failed: {e}"
+            return result
 
-    # 4. Store in Chroma
+    # 3+4. Generate embeddings and store each checkpointed batch as it completes
     try:
-        raw_text = "\n".join([doc.page_content for doc in documents])
-        store_document(file_path, raw_text, chunks, generated_embeddings)
-        logger.info(f"[Pipeline] Document stored successfully.")
+        started = time.perf_counter()
+        # Fails before any tokens are paid for if the collection uses another model or dimension.
+        backend = default_backend()
+        check_collection_space(backend.space)
+        raw_text = "\n".join([doc.page_content for doc in result.documents])
+        # Chunks stored by an interrupted run are skipped; vectors it embedded but did not store
+        # come back from the checkpoint of this file.
+        document_key = file_digest(file_path)
+        seen = known_hashes(chunk.metadata["content_hash"] for chunk in result.chunks)
+        parents = result.parents
+        store_seconds = 0.0
+
+        def store_batch(batch: EmbeddedChunks) -> None:
+            nonlocal parents, store_seconds
+            batch_started = time.perf_counter()
+            store_document(file_path, raw_text, batch.chunks, batch, parents=parents)
+            parents = None  # stored with the first batch
+            store_seconds += time.perf_counter() - batch_started
+
+        embedded = embed_documents(result.chunks, backend=backend, seen_hashes=seen, failed=result.failed_chunks,
+                                   checkpoint=document_key, on_batch=store_batch)
+        if parents:
+            store_parents(parents)  # nothing new to embed
+        # References for chunks whose text was already stored (repeats, earlier documents).
+        record_chunks(result.chunks)
+        clear_checkpoint(document_key)
+        result.embedding_count = len(embedded)
+        result.timings["embed"] = time.perf_counter() - started - store_seconds
+        result.timings["store"] = store_seconds
+        logger.info(f"[Pipeline] Embedding complete. {len(embedded)} embeddings generated and stored.")
+        if result.failed_chunks:
+            logger.warning(f"[Pipeline] {len(result.failed_chunks)} chunks could not be embedded.")
     except Exception as e:
-        logger.error(f"[Pipeline] Storing failed: {e}")
-        return
+        logger.error(f"[Pipeline] Embedding or storing failed: {e}")
+        result.error = f"Embedding or storing failed (rerun to resume from the last completed batch): {e}"
+        return result
 
+    timings = ", ".join(f"{stage}={seconds:.2f}s" for stage, seconds in result.timings.items())
+    logger.info(f"[Pipeline] Stage timings: {timings}")
     logger.info("[Pipeline] Pipeline execution finished.\n")
+    return result
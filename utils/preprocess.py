@@ -0,0 +1,121 @@
+import re
+from typing import Dict, Iterable, Iterator, List, Optional, Set
+import numpy as np
+from langchain.docstore.document import Document
+from utils.chunks import tiktoken_len
+from utils.logger import logger
+
+# A normalised line is boilerplate when it appears on at least this share of a document's pages...
+BOILERPLATE_MIN_RATIO = 0.5
+# ...and on at least this many pages, so short documents keep their text.
+BOILERPLATE_MIN_PAGES = 3
+# Repeated long lines are quoted text (statutory extracts), not headers or footers.
+BOILERPLATE_MAX_LINE_CHARS = 120
+# Repeated lines are learnt from the first pages of each document, so the stage can stream.
+BOILERPLATE_SAMPLE_PAGES = 64
+# Headers and footers sit at the top and bottom of a page: only this many non-empty lines at
+# either end are candidates. Repeated lines in the body (form labels, "Amount awarded:") are content.
+BOILERPLATE_EDGE_LINES = 2
+
+_SPACES = re.compile(r"\s+")
+_HYPHEN_BREAK = re.compile(r"([a-z])-\n([a-z])")
+# Page counters ("3", "- 3 -", "Page 3", "Page 3 of 25", "3/25") as the whole line or at either
+# end of one. Other digits are kept: lines that differ in a date or amount are different lines.
+_COUNTER = r"[-–(\[]?\s*(?:page|pg\.?|p\.)?\s*\d{1,4}(?:\s*(?:of|/)\s*\d{1,4})?\s*[-–)\]]?"
+_PAGE_COUNTER = re.compile(rf"^{_COUNTER}$|^{_COUNTER}(?=\s)|(?<=\s){_COUNTER}$")
+
+
+def normalize_line(line: str) -> str:
+    # Page counters collapse to '#', so "Page 3 of 25" and "Page 4 of 25" count as the same line.
+    return _PAGE_COUNTER.sub("#", _SPACES.sub(" ", line.lower()).strip())
+
+
+def _line_key(line: str) -> Optional[int]:
+    if len(line) > BOILERPLATE_MAX_LINE_CHARS:
+        return None
+    normalized = normalize_line(line)
+    return hash(normalized) if normalized else None
+
+
+def _edge_lines(lines: List[str]) -> Set[int]:
+    # Indexes of the first and last BOILERPLATE_EDGE_LINES non-empty lines.
+    filled = [i for i, line in enumerate(lines) if line.strip()]
+    return set(filled[:BOILERPLATE_EDGE_LINES] + filled[-BOILERPLATE_EDGE_LINES:])
+
+
+def _edge_keys(page: Document) -> Set[int]:
+    lines = page.page_content.split("\n")
+    return {key for key in (_line_key(lines[i]) for i in _edge_lines(lines)) if key is not None}
+
+
+def learn_boilerplate(pages: List[Document]) -> Set[int]:
+    """
+    Return the keys of header/footer lines repeated across `pages`, counted once per page with
+    NumPy; only the lines at the top and bottom of each page are counted.
+    """
+    per_page = [np.fromiter(_edge_keys(page), dtype=np.int64) for page in pages]
+    if not per_page:
+        return set()
+    keys, counts = np.unique(np.concatenate(per_page), return_counts=True)
+    threshold = max(BOILERPLATE_MIN_PAGES, int(np.ceil(BOILERPLATE_MIN_RATIO * len(pages))))
+    return set(keys[counts >= threshold].tolist())
+
+
+def clean_page(doc: Document, boilerplate: Set[int]) -> Document:
+    kept, removed = [], []
+    lines = doc.page_content.split("\n")
+    edges = _edge_lines(lines) if boilerplate else set()
+    for i, line in enumerate(lines):
+        (removed if i in edges and _line_key(line) in boilerplate else kept).append(line)
+    text = _HYPHEN_BREAK.sub(r"\1\2", "\n".join(kept))
+    return Document(
+        page_content=text,
+        metadata={**doc.metadata, "boilerplate_tokens": tiktoken_len("\n".join(removed)) if removed else 0}
+    )
+
+
+def _cleaned(pages: List[Document], boilerplate: Set[int], report: Dict[str, int]) -> Iterator[Document]:
+    for page in pages:
+        cleaned = clean_page(page, boilerplate)
+        source = cleaned.metadata.get("source", "unknown")
+        report[source] = report.get(source, 0) + cleaned.metadata["boilerplate_tokens"]
+        yield cleaned
+
+
+def strip_boilerplate(documents: Iterable[Document], report: Optional[Dict[str, int]] = None) -> Iterator[Document]:
+    """
+    Remove headers, footers, page numbers and watermark lines repeated across the pages of
+    each document, and re-join words hyphenated across line breaks. Only PDF/OCR pages
+    (those with an "engine" in their metadata) are scanned for repeated lines; DOCX parts and
+    TXT virtual pages have no running headers, and repeated short lines there are content.
+    Tokens removed per source are added to `report` and logged.
+    """
+    report = {} if report is None else report
+    source = None
+    sample: List[Document] = []
+    boilerplate: Optional[Set[int]] = None
+
+    for doc in documents:
+        doc_source = doc.metadata.get("source", "unknown")
+        if doc_source != source:
+            if sample:
+                yield from _cleaned(sample, learn_boilerplate(sample), report)
+            if source is not None:
+                logger.info(f"[Preprocess] Removed {report.get(source, 0)} boilerplate tokens from {source}")
+            source, sample, boilerplate = doc_source, [], None
+            if "engine" not in doc.metadata:
+                boilerplate = set()
+
+        if boilerplate is not None:
+            yield from _cleaned([doc], boilerplate, report)
+            continue
+        sample.append(doc)
+        if len(sample) >= BOILERPLATE_SAMPLE_PAGES:
+            boilerplate = learn_boilerplate(sample)
+            yield from _cleaned(sample, boilerplate, report)
+            sample = []
+
+    if sample:
+        yield from _cleaned(sample, learn_boilerplate(sample), report)
+    if source is not None:
+        logger.info(f"[Preprocess] Removed {report.get(source, 0)} boilerplate tokens from {source}")
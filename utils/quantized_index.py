@@ -0,0 +1,299 @@
+import os
+import json
+import threading
+from functools import lru_cache
+from typing import List, Optional, Sequence, Tuple
+import numpy as np
+from utils.logger import logger
+
+# "chroma" keeps vectors in the collection's float32 HNSW index, which must fit in RAM. "int8"
+# (1 byte per dimension, 4x smaller) or "binary" (1 bit, 32x smaller) keeps only quantized codes
+# in memory for candidate generation; candidates are rescored against the float32 vectors,
+# memory-mapped from disk.
+VECTOR_INDEX = os.getenv("VECTOR_INDEX", "chroma")
+QUANTIZATION_MODES = ("int8", "binary")
+VECTOR_INDEXES = ("chroma",) + QUANTIZATION_MODES
+
+QUANTIZED_INDEX_DIR = os.path.join("chroma_store", "quantized")
+# Candidates rescored with float32 per query: more raises recall at the cost of disk reads.
+RESCORE_CANDIDATES = 200
+# Codes scored per block, bounding the temporary float32 copy during an int8 scan.
+SCAN_BLOCK_ROWS = 8192
+# int8 ranges (per dimension) are recomputed from all vectors, and every code re-encoded, until
+# the index holds this many; after that they are fixed and outliers are clipped.
+INT8_CALIBRATION_ROWS = 10000
+
+# Set bits per byte value, for Hamming distances between packed binary codes.
+POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    # Unit length, so a dot product is the cosine similarity.
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
+
+
+class QuantizedIndex:
+    """
+    Append-only vector index in `path`. ids.txt and vectors.f32 (normalized float32 rows) are
+    the source of truth; the codes of each mode are derived from them, and rebuilt on open if
+    missing or behind (e.g. after an interrupted add or a change of mode). One process adds at a
+    time; the others pick up its rows with refresh(), which every search calls.
+    """
+
+    def __init__(self, path: str = QUANTIZED_INDEX_DIR, mode: str = "int8"):
+        if mode not in QUANTIZATION_MODES:
+            raise ValueError(f"Unknown quantization mode: {mode}. Supported: {', '.join(QUANTIZATION_MODES)}")
+        self.path = path
+        self.mode = mode
+        self.dimensions = 0
+        self.ids: List[str] = []
+        self._ids_bytes = 0  # length of ids.txt covered by self.ids
+        self._ranges_mtime = 0.0
+        self._seen = set()
+        self._ranges: Optional[np.ndarray] = None  # int8: per-dimension (low, high)
+        self._codes = np.empty((0, 0), dtype=np.uint8)  # grown with spare capacity; rows past len(ids) unused
+        self._vectors: Optional[np.memmap] = None
+        self._lock = threading.Lock()
+        if os.path.exists(self._file("meta.json")):
+            self._load()
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @property
+    def memory_bytes(self) -> int:
+        """Bytes of quantized codes held in memory (ids not included)."""
+        return len(self.ids) * self._code_width()
+
+    def _file(self, name: str) -> str:
+        return os.path.join(self.path, name)
+
+    def _code_width(self) -> int:
+        return self.dimensions if self.mode == "int8" else (self.dimensions + 7) // 8
+
+    def _codes_file(self) -> str:
+        return self._file(f"codes-{self.mode}.u8")
+
+    def _load(self) -> None:
+        with open(self._file("meta.json"), encoding="utf-8") as f:
+            self.dimensions = json.load(f)["dimensions"]
+        ids = []
+        if os.path.exists(self._file("ids.txt")):
+            with open(self._file("ids.txt"), encoding="utf-8") as f:
+                ids = f.read().splitlines()
+        # Vectors are written before ids, so rows past the last id belong to an interrupted add.
+        row_bytes = self.dimensions * 4
+        stored = os.path.getsize(self._file("vectors.f32")) if os.path.exists(self._file("vectors.f32")) else 0
+        rows = min(len(ids), stored // row_bytes)
+        if stored > rows * row_bytes:
+            os.truncate(self._file("vectors.f32"), rows * row_bytes)
+        self.ids = ids[:rows]
+        self._ids_bytes = sum(len(vector_id.encode("utf-8")) + 1 for vector_id in self.ids)
+        self._seen = set(self.ids)
+
+        if self.mode == "int8" and os.path.exists(self._file("ranges-int8.npy")):
+            self._load_ranges()
+        width = self._code_width()
+        codes = np.fromfile(self._codes_file(), dtype=np.uint8) if os.path.exists(self._codes_file()) else \
+            np.empty(0, dtype=np.uint8)
+        encoded = min(rows, len(codes) // width)
+        if self.mode == "int8" and self._ranges is None:
+            encoded = 0
+        self._codes = codes[:encoded * width].reshape(encoded, width)
+        if encoded < rows:
+            logger.info(f"[Quantized Index] Encoding {rows - encoded} of {rows} vectors as {self.mode}")
+            if self.mode == "int8" and self._ranges is None:
+                self._calibrate()
+            else:
+                self._write_codes(self._encode_rows(encoded, rows), rewrite=encoded == 0, keep=encoded)
+        logger.info(f"[Quantized Index] Loaded {rows} vectors ({self.mode}, {self.memory_bytes / 2 ** 20:.1f} MB "
+                    f"in memory)")
+
+    def _load_ranges(self) -> None:
+        self._ranges_mtime = os.path.getmtime(self._file("ranges-int8.npy"))
+        self._ranges = np.load(self._file("ranges-int8.npy"))
+
+    def refresh(self) -> int:
+        """
+        Pick up rows another process added since this one loaded; returns how many. Only
+        reads the files: the new rows are encoded in memory and the codes on disk are left
+        to the process that writes them.
+        """
+        with self._lock:
+            return self._refresh()
+
+    def _refresh(self) -> int:
+        ids_file = self._file("ids.txt")
+        if not os.path.exists(ids_file) or os.path.getsize(ids_file) <= self._ids_bytes:
+            return 0
+        if not self.dimensions:
+            with open(self._file("meta.json"), encoding="utf-8") as f:
+                self.dimensions = json.load(f)["dimensions"]
+        with open(ids_file, "rb") as f:
+            f.seek(self._ids_bytes)
+            tail = f.read()
+        # Whole lines only: a partial last line belongs to an add still in progress.
+        lines = tail[:tail.rfind(b"\n") + 1].decode("utf-8").splitlines()
+        start = len(self.ids)
+        stored = os.path.getsize(self._file("vectors.f32")) // (self.dimensions * 4)
+        lines = lines[:max(0, stored - start)]
+        if not lines:
+            return 0
+        self._ids_bytes += sum(len(vector_id.encode("utf-8")) + 1 for vector_id in lines)
+        self.ids.extend(lines)
+        self._seen.update(lines)
+
+        rows = len(self.ids)
+        if self.mode == "int8":
+            ranges_file = self._file("ranges-int8.npy")
+            if os.path.exists(ranges_file) and os.path.getmtime(ranges_file) != self._ranges_mtime:
+                # Recalibrated by the writer: every code changes.
+                self._load_ranges()
+                start = 0
+            elif self._ranges is None:
+                vectors = np.memmap(self._file("vectors.f32"), dtype=np.float32, mode="r",
+                                    shape=(rows, self.dimensions))
+                self._ranges = np.stack([vectors.min(axis=0), vectors.max(axis=0)])
+                start = 0
+        self._store_codes(self._encode_rows(start, rows), keep=start)
+        logger.info(f"[Quantized Index] Picked up {len(lines)} vectors added elsewhere ({rows} in total)")
+        return len(lines)
+
+    def _vector_map(self) -> np.memmap:
+        rows = len(self.ids)
+        if self._vectors is None or self._vectors.shape[0] != rows:
+            self._vectors = np.memmap(self._file("vectors.f32"), dtype=np.float32, mode="r",
+                                      shape=(rows, self.dimensions))
+        return self._vectors
+
+    def _encode(self, vectors: np.ndarray) -> np.ndarray:
+        if self.mode == "binary":
+            return np.packbits(vectors > 0, axis=1)
+        low, high = self._ranges
+        scale = np.where(high > low, (high - low) / 255, 1)
+        return np.clip(np.rint((vectors - low) / scale), 0, 255).astype(np.uint8)
+
+    def _encode_rows(self, start: int, end: int) -> np.ndarray:
+        vectors = np.memmap(self._file("vectors.f32"), dtype=np.float32, mode="r", shape=(end, self.dimensions))
+        return np.concatenate([self._encode(vectors[i:min(i + SCAN_BLOCK_ROWS, end)])
+                               for i in range(start, end, SCAN_BLOCK_ROWS)] or
+                              [np.empty((0, self._code_width()), dtype=np.uint8)])
+
+    def _write_codes(self, codes: np.ndarray, rewrite: bool, keep: int) -> None:
+        # Appends `codes` after the first `keep` rows (or replaces all of them with `rewrite`).
+        with open(self._codes_file(), "wb" if rewrite else "ab") as f:
+            if not rewrite:
+                f.truncate(keep * self._code_width())
+            codes.tofile(f)
+        self._store_codes(codes, keep)
+
+    def _store_codes(self, codes: np.ndarray, keep: int) -> None:
+        # In memory: `codes` follow the first `keep` rows, with spare capacity for later adds.
+        rows = keep + len(codes)
+        if rows > len(self._codes) or not keep:
+            buffer = np.empty((max(rows, 2 * len(self._codes)), self._code_width()), dtype=np.uint8)
+            if keep:
+                buffer[:keep] = self._codes[:keep]
+            self._codes = buffer
+        self._codes[keep:rows] = codes
+
+    def _calibrate(self) -> None:
+        vectors = np.memmap(self._file("vectors.f32"), dtype=np.float32, mode="r",
+                            shape=(len(self.ids), self.dimensions))
+        self._ranges = np.stack([vectors.min(axis=0), vectors.max(axis=0)])
+        np.save(self._file("ranges-int8.npy"), self._ranges)
+        self._ranges_mtime = os.path.getmtime(self._file("ranges-int8.npy"))
+        self._write_codes(self._encode_rows(0, len(self.ids)), rewrite=True, keep=0)
+
+    def add(self, ids: Sequence[str], vectors: np.ndarray) -> int:
+        """Append vectors under `ids`, skipping ids already indexed; returns the number added."""
+        with self._lock:
+            self._refresh()
+            keep, batch = [], set()
+            for i, vector_id in enumerate(ids):
+                if vector_id not in self._seen and vector_id not in batch:
+                    batch.add(vector_id)
+                    keep.append(i)
+            if not keep:
+                return 0
+            vectors = _normalize(np.asarray(vectors, dtype=np.float32)[keep])
+            if not self.dimensions:
+                os.makedirs(self.path, exist_ok=True)
+                self.dimensions = vectors.shape[1]
+                with open(self._file("meta.json"), "w", encoding="utf-8") as f:
+                    json.dump({"dimensions": self.dimensions}, f)
+            elif vectors.shape[1] != self.dimensions:
+                raise ValueError(f"Vectors have {vectors.shape[1]} dimensions; the index holds {self.dimensions}.")
+
+            start = len(self.ids)
+            with open(self._file("vectors.f32"), "ab") as f:
+                vectors.tofile(f)
+            new_ids = [ids[i] for i in keep]
+            lines = "".join(f"{vector_id}\n" for vector_id in new_ids)
+            with open(self._file("ids.txt"), "a", encoding="utf-8") as f:
+                f.write(lines)
+            self._ids_bytes += len(lines.encode("utf-8"))
+            self.ids.extend(new_ids)
+            self._seen.update(new_ids)
+
+            if self.mode == "int8" and len(self.ids) <= INT8_CALIBRATION_ROWS:
+                self._calibrate()
+            else:
+                self._write_codes(self._encode(vectors), rewrite=False, keep=start)
+            logger.info(f"[Quantized Index] Added {len(new_ids)} vectors ({len(self.ids)} in total)")
+            return len(new_ids)
+
+    def _approximate(self, codes: np.ndarray, query: np.ndarray) -> np.ndarray:
+        # Higher is closer. int8 drops the query's constant low·q term, which does not change the order.
+        if self.mode == "binary":
+            distances = POPCOUNT[np.bitwise_xor(codes, np.packbits(query > 0))].sum(axis=1, dtype=np.int32)
+            return -distances.astype(np.float32)
+        low, high = self._ranges
+        scale = np.where(high > low, (high - low) / 255, 1)
+        return codes.astype(np.float32) @ (query * scale)
+
+    def search(self, query: np.ndarray, k: int = 10,
+               candidates: int = RESCORE_CANDIDATES) -> List[Tuple[str, float]]:
+        """
+        (id, cosine similarity) of the `k` best matches: the best `candidates` by quantized
+        score, rescored with their float32 vectors.
+        """
+        self.refresh()
+        query = _normalize(np.asarray(query, dtype=np.float32))
+        rows = len(self.ids)
+        if not rows:
+            return []
+        codes = self._codes[:rows]
+        scores = np.empty(rows, dtype=np.float32)
+        for start in range(0, rows, SCAN_BLOCK_ROWS):
+            end = min(start + SCAN_BLOCK_ROWS, rows)
+            scores[start:end] = self._approximate(codes[start:end], query)
+
+        keep = min(max(candidates, k), rows)
+        # Sorted, so the rows are read from disk in file order.
+        shortlist = np.sort(np.argpartition(-scores, keep - 1)[:keep])
+        exact = self._vector_map()[shortlist] @ query
+        best = np.argsort(-exact)[:k]
+        return [(self.ids[shortlist[i]], float(exact[i])) for i in best]
+
+    def exact_search(self, query: np.ndarray, k: int = 10) -> List[Tuple[str, float]]:
+        """Brute-force float32 search over every vector on disk; the baseline for search()."""
+        self.refresh()
+        query = _normalize(np.asarray(query, dtype=np.float32))
+        rows = len(self.ids)
+        if not rows:
+            return []
+        vectors = self._vector_map()
+        scores = np.concatenate([vectors[i:i + SCAN_BLOCK_ROWS] @ query for i in range(0, rows, SCAN_BLOCK_ROWS)])
+        keep = min(k, rows)
+        best = np.argpartition(-scores, keep - 1)[:keep]
+        best = best[np.argsort(-scores[best])]
+        return [(self.ids[i], float(scores[i])) for i in best]
+
+
+@lru_cache(maxsize=None)
+def default_index() -> QuantizedIndex:
+    # One instance per process, shared by ingestion and the retriever; searches also refresh() from disk,
+    # so vectors another process adds become searchable there too.
+    return QuantizedIndex(mode=VECTOR_INDEX)
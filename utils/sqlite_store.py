@@ -0,0 +1,35 @@
+import os
+import sqlite3
+from typing import Iterable, Iterator, Sequence
+import numpy as np
+
+# SQLite caps bound parameters per statement, so IN (...) lookups go in slices of this many keys.
+LOOKUP_SLICE = 500
+
+
+def connect(path: str, schema: Sequence[str]) -> sqlite3.Connection:
+    """Open the database at `path`, creating its directory and any missing tables (`schema`)."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    conn = sqlite3.connect(path)
+    for statement in schema:
+        conn.execute(statement)
+    return conn
+
+
+def select_in(conn: sqlite3.Connection, query: str, keys: Iterable[str], params: Sequence = ()) -> Iterator[tuple]:
+    """
+    Rows of `query` for all of `keys`: its "{keys}" placeholder becomes the parameter list of an
+    IN (...), run once per LOOKUP_SLICE keys. `params` bind the placeholders that come before it.
+    """
+    keys = list(keys)
+    for i in range(0, len(keys), LOOKUP_SLICE):
+        part = keys[i:i + LOOKUP_SLICE]
+        yield from conn.execute(query.format(keys=", ".join("?" for _ in part)), [*params, *part])
+
+
+def vector_blob(vector: Sequence[float]) -> bytes:
+    return np.asarray(vector, dtype=np.float32).tobytes()
+
+
+def blob_vector(blob: bytes) -> np.ndarray:
+    return np.frombuffer(blob, dtype=np.float32)
@@ -1,41 +1,114 @@
-import os
-from typing import List, Dict, Any
+from typing import Iterable, List, Dict, Any, Optional
+import numpy as np
 from chromadb import PersistentClient
+from utils.chunk_store import known_hashes, store_chunks
+from utils.chunks import content_hash
+from utils.embedding_backends import LEGACY_EMBEDDING_SPACE, check_embedding_space
+from utils.embedding_generator import EmbeddedChunks
+from utils.parent_store import store_parents
+from utils.quantized_index import QUANTIZATION_MODES, VECTOR_INDEX, VECTOR_INDEXES, default_index
 from utils.logger import logger
 
 PERSIST_DIR = "chroma_store"
 COLLECTION_NAME = "legal_documents"
 
+if VECTOR_INDEX not in VECTOR_INDEXES:
+    raise ValueError(f"Unknown VECTOR_INDEX: {VECTOR_INDEX}. Supported: {', '.join(VECTOR_INDEXES)}")
+
 # Initialize persistent client
 client = PersistentClient(path=PERSIST_DIR)
 
-def store_document(file_path: str, raw_text: str, chunks: List[Any], embeddings: List[Dict[str, Any]]) -> None:
+
+def get_collection():
+    """The document collection, created empty if nothing has been stored yet."""
+    return client.get_or_create_collection(name=COLLECTION_NAME)
+
+
+def recorded_space(collection) -> Dict[str, Any]:
+    """
+    The embedding space `collection` was built with. One that holds vectors but no record
+    predates recording and is LEGACY_EMBEDDING_SPACE; an empty one has no space yet ({}).
+    """
+    metadata = collection.metadata or {}
+    if "embedding_model" in metadata:
+        return metadata
+    return dict(LEGACY_EMBEDDING_SPACE) if collection.count() else {}
+
+
+def check_collection_space(space: Dict[str, Any]):
+    """
+    Return the collection, tagged with the embedding `space` (EmbeddingBackend.space) it is
+    built with. Raises ValueError if it already holds vectors of another model or dimension.
+    """
+    collection = get_collection()
+    metadata = collection.metadata or {}
+    recorded = recorded_space(collection)
+    check_embedding_space(recorded, space)
+    if "embedding_model" not in metadata:
+        # New, or filled before spaces were recorded and (checked above) in the legacy space.
+        collection.modify(metadata={**metadata, **(recorded or space)})
+    return collection
+
+
+def record_chunks(chunks: List[Any], stored_ids: Iterable[str] = ()) -> None:
+    """
+    Record chunk references, after the vectors, and only for texts that are in the store
+    (`stored_ids` or recorded earlier): chunks of a failed embedding batch stay unknown and are
+    embedded on the next run.
+    """
+    hashes = [chunk.metadata["content_hash"] for chunk in chunks if "content_hash" in chunk.metadata]
+    in_collection = set(stored_ids) | known_hashes(hashes)
+    store_chunks(chunk for chunk in chunks if chunk.metadata.get("content_hash") in in_collection)
+
+
+def store_document(file_path: str, raw_text: str, chunks: List[Any], embedded: EmbeddedChunks,
+                   parents: Optional[List[Any]] = None) -> None:
     try:
         logger.info(f"[Chroma Store] Storing document from: {file_path}")
-        
-        # Create or get collection
-        collection = client.get_or_create_collection(name=COLLECTION_NAME)
 
-        ids = []
-        documents = []
-        metadatas = []
-        embeddings_list = []
+        # Parent spans are not embedded; the retriever looks them up by the children's parent_id.
+        if parents:
+            store_parents(parents)
+        
+        # Create or get collection; refuses vectors of another embedding model or dimension
+        collection = check_collection_space(embedded.space)
 
-        for i, entry in enumerate(embeddings):
-            ids.append(f"{os.path.basename(file_path)}_{i}")
-            documents.append(entry["text"])
-            metadatas.append(entry["metadata"])
-            embeddings_list.append(entry["embedding"])
+        # Chunks are stored once under their content hash; `embedded` only holds new texts, and
+        # ids do not depend on position, so chunks that failed to embed cannot shift them.
+        ids = [chunk.metadata.get("content_hash") or content_hash(chunk.page_content) for chunk in embedded.chunks]
 
-        collection.add(
-            ids=ids,
-            documents=documents,
-            metadatas=metadatas,
-            embeddings=embeddings_list
-        )
+        if ids and VECTOR_INDEX in QUANTIZATION_MODES:
+            # Vectors only; texts and metadata are read back from the chunk store.
+            default_index().add(ids, embedded.vectors)
+        elif ids:
+            collection.add(
+                ids=ids,
+                documents=[chunk.page_content for chunk in embedded.chunks],
+                metadatas=[chunk.metadata for chunk in embedded.chunks],
+                # The float32 matrix as is: a list of Python floats would take ~4x the memory.
+                embeddings=embedded.vectors
+            )
+        record_chunks(chunks, ids)
 
-        logger.info(f"[Chroma Store] Stored {len(ids)} items in collection '{COLLECTION_NAME}'")
+        logger.info(f"[Chroma Store] Stored {len(ids)} items in {VECTOR_INDEX} index of '{COLLECTION_NAME}'")
 
     except Exception as e:
         logger.error(f"[Chroma Store] Failed to store document: {e}")
         raise
+
+
+def export_to_quantized_index(page_size: int = 5000) -> int:
+    """
+    Copy the vectors of the Chroma collection into the quantized index (VECTOR_INDEX "int8" or
+    "binary"), e.g. when switching an existing store over; returns the number added.
+    """
+    if VECTOR_INDEX not in QUANTIZATION_MODES:
+        raise ValueError(f"Set VECTOR_INDEX to one of {', '.join(QUANTIZATION_MODES)} to export to a quantized index.")
+    collection = get_collection()
+    index = default_index()
+    added = 0
+    for offset in range(0, collection.count(), page_size):
+        page = collection.get(limit=page_size, offset=offset, include=["embeddings"])
+        added += index.add(page["ids"], np.asarray(page["embeddings"], dtype=np.float32))
+    logger.info(f"[Chroma Store] Exported {added} vectors to the {VECTOR_INDEX} index")
+    return added
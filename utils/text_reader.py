@@ -0,0 +1,76 @@
+import codecs
+import mmap
+from typing import Iterator, Tuple
+from charset_normalizer import from_bytes
+
+DETECT_SAMPLE_BYTES = 256 * 1024
+FALLBACK_ENCODING = "cp1252"
+
+# Checked longest first: the UTF-32 LE BOM starts with the UTF-16 LE one.
+BOMS = (
+    (codecs.BOM_UTF32_LE, "utf-32-le"),
+    (codecs.BOM_UTF32_BE, "utf-32-be"),
+    (codecs.BOM_UTF8, "utf-8"),
+    (codecs.BOM_UTF16_LE, "utf-16-le"),
+    (codecs.BOM_UTF16_BE, "utf-16-be"),
+)
+
+# (text, byte_start, byte_end, encoding) of one virtual page; offsets are into the raw file.
+TextPage = Tuple[str, int, int, str]
+
+
+def detect_encoding(data: mmap.mmap) -> Tuple[str, int]:
+    """Return (encoding, BOM length) from a BOM, a UTF-8 check on a sample, or charset detection."""
+    head = data[:4]
+    for bom, encoding in BOMS:
+        if head.startswith(bom):
+            return encoding, len(bom)
+
+    sample = data[:DETECT_SAMPLE_BYTES]
+    try:
+        # Not final: the sample may end in the middle of a multi-byte character.
+        codecs.getincrementaldecoder("utf-8")().decode(sample, final=False)
+        return "utf-8", 0
+    except UnicodeDecodeError:
+        pass
+
+    best = from_bytes(sample).best()
+    return (best.encoding if best else FALLBACK_ENCODING), 0
+
+
+def _unit_size(encoding: str) -> int:
+    if encoding.startswith("utf-32"):
+        return 4
+    if encoding.startswith("utf-16"):
+        return 2
+    return 1
+
+
+def iter_text_pages(file_path: str, page_bytes: int) -> Iterator[TextPage]:
+    """
+    Memory-map `file_path` and yield consecutive virtual pages of about `page_bytes` bytes.
+    Page ends are moved back to the last newline in the second half of the window when
+    there is one. An incremental decoder carries characters that straddle
+    a page end over to the next page, so no character is ever split.
+    """
+    with open(file_path, "rb") as f:
+        if f.seek(0, 2) == 0:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            encoding, start = detect_encoding(data)
+            unit = _unit_size(encoding)
+            newline = "\n".encode(encoding)
+            decoder = codecs.getincrementaldecoder(encoding)(errors="replace")
+            size = len(data)
+
+            while start < size:
+                end = min(start + page_bytes, size)
+                if end < size:
+                    cut = data.rfind(newline, start + page_bytes // 2, end)
+                    if cut != -1 and (cut - start) % unit == 0:
+                        end = cut + len(newline)
+                    else:
+                        end -= (end - start) % unit
+                text = decoder.decode(data[start:end], final=end == size)
+                yield text, start, end, encoding
+                start = end